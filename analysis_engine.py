@@ -3,15 +3,23 @@ Core analysis engine for pilot trip data
 Contains all the calculation logic from the original analysis
 """
 
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 import re
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.lib import colors
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.widgets.markers import makeMarker
 
 # Base mapping
 BASE_MAPPING = {
@@ -25,59 +33,269 @@ BASE_MAPPING = {
     'LAX': 'LAX', 'LGB': 'LAX', 'ONT': 'LAX'
 }
 
+# Small integer id per base (UNKNOWN last) so per-trip bases fit an int8 array,
+# and the departure airport to base id lookup used when building it
+BASE_IDS = {base: i for i, base in enumerate(sorted(set(BASE_MAPPING.values())) + ['UNKNOWN'])}
+AIRPORT_BASE_ID = {airport: BASE_IDS[base] for airport, base in BASE_MAPPING.items()}
+
+# Base to the airports that map to it
+BASE_AIRPORTS = {
+    base: frozenset(airport for airport, airport_base in BASE_MAPPING.items() if airport_base == base)
+    for base in set(BASE_MAPPING.values())
+}
+
+# Whole-token match for any of a base's airports - a file with no match has no trips there
+BASE_AIRPORT_RE = {
+    base: re.compile(r'(?<!\S)(?:%s)(?!\S)' % '|'.join(sorted(airports)))
+    for base, airports in BASE_AIRPORTS.items()
+}
+
+# Duty-day letters in the DAY column, and trip length for the last one
+DAY_LETTERS = frozenset(('A', 'B', 'C', 'D', 'E'))
+DAY_LETTER_LENGTH = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5}
+
+# Day-of-week code to datetime.weekday()
+DOW_INDEX = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+# Window of Circadian Low (02:00-05:59) in minutes since midnight, for red-eye checks
+WOCL_START_MINUTES = 2 * 60
+WOCL_END_MINUTES = 5 * 60 + 59
+
+# Every 4-digit HHMM string to minutes past midnight (HH * 60 + MM)
+HHMM_MINUTES = {f'{n:04d}': (n // 100) * 60 + n % 100 for n in range(10000)}
+
+# Longest trip (in days) counted by analyze_file
+MAX_TRIP_LENGTH = 7
+
+# Month abbreviation (as printed in trip headers) to month number
+MONTH_ABBR_NUM = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
+}
+
+# Bid month name to month number, and the previous month's abbreviation by number
+MONTH_NAME_NUM = {
+    'January': 1, 'February': 2, 'March': 3, 'April': 4,
+    'May': 5, 'June': 6, 'July': 7, 'August': 8,
+    'September': 9, 'October': 10, 'November': 11, 'December': 12
+}
+PREV_MONTH_ABBR = ('', 'DEC', 'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV')
+
+# Precompiled patterns for trip headers and duty-day lines
+MONTH_ALT = r'(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)'
+DOW_RE = re.compile(r'\b(MO|TU|WE|TH|FR|SA|SU)\b')
+# FEB14 ONLY / FEB14-MAR. 01 / JAN15-28
+EFFECTIVE_DATES_RE = re.compile(
+    rf'\b(?P<month1>{MONTH_ALT})(?P<day1>\d{{1,2}})'
+    rf'(?:\s+(?P<only>ONLY)|-(?:(?P<month2>{MONTH_ALT})\.\s*)?(?P<day2>\d{{1,2}}))\b'
+)
+# EXCEPT FEB 14 MAR 02
+EXCEPT_RE = re.compile(rf'\b{MONTH_ALT}\s+(\d{{1,2}})\b')
+# #4527 or #L832 (the heat map only counts numeric trip numbers)
+TRIP_NUM_RE = re.compile(r'#([A-Z]?\d+)')
+NUMERIC_TRIP_NUM_RE = re.compile(r'#(\d+)')
+DAY_COL_RE = re.compile(r'\s+([A-Z])\s+\d+')
+# TOTAL PAY 5:15TL  0.45SIT  1.02EDP  0.00HOL  0.30CARVE -> token after PAY (left in
+# place so it is still checked for a suffix), or a value token and its suffix
+TOTAL_PAY_RE = re.compile(
+    r'(?<!\S)(?:PAY(?=\s+(?P<pay>\S+))|(?P<value>\S*?)(?P<field>SIT|EDP|HOL|CARVE))(?!\S)'
+)
+# Trip terminator line ("-----..."), matched without its newline
+TRIP_END_RE = re.compile(r'^[^\S\n]*---[^\n]*', re.MULTILINE)
+# ATL 0600  BOS 0842*  2.42 -> dep airport, dep time, arr airport, arr time
+# (either time may carry '*' markers, which are not captured) and the next
+# three tokens, where the block time is looked for (see _block_time_minutes).
+# The tokens are read by a lookahead, so a following leg on the line still matches.
+# The token-start lookbehind sits after the airport code so the pattern opens
+# with [A-Z], letting the engine skip ahead to capitals on lines with no legs
+FLIGHT_LEG_RE = re.compile(
+    r'([A-Z]{3})(?<!\S[A-Z]{3})\s+(\d{4})\**\s+([A-Z]{3})\s+(\d{4})\**(?!\S)'
+    r'(?=((?:\s+\S+){0,3}))'
+)
+# The leg chained on from a FLIGHT_LEG_RE match's arrival (ATL 0600  BOS 0842
+# SEA 1130 -> BOS 0842  SEA 1130), which the non-overlapping search steps over
+# but the original BLK scanner also read. Matched from the end of the arrival
+# time, it captures the next three tokens for the block time
+CHAINED_LEG_RE = re.compile(r'\s+[A-Z]{3}\s+\d{4}\**(?!\S)((?:\s+\S+){0,3})')
+
+# Reports larger than this are spooled to a temp file while being built
+PDF_SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+# Text settings for the PDF trend charts: one known font, no TeX/mathtext lookups.
+# Passed to each text artist rather than through rcParams, which are process-wide
+TREND_CHART_TEXT = {
+    'family': 'DejaVu Sans',
+    'usetex': False,
+    'parse_math': False,
+}
+
+# Raster resolution for the trend chart PNGs; the 10in figure is placed 7in wide,
+# so this still lands at ~140 dpi on the page
+TREND_CHART_DPI = 100
+
+# Palette size for the trend chart PNGs (series colours plus grid/antialiasing)
+TREND_CHART_PNG_COLORS = 16
+
+# Matplotlib settings for the base report PDF pages: embed TrueType font subsets
+# rather than Type 3 glyph procedures. The PDF backend only reads these from the
+# process-wide rcParams, so they are set (never restored) before each report
+BASE_REPORT_RC = {
+    'pdf.fonttype': 42,
+}
+
+# Series colours for the vector trend charts (matplotlib's default cycle)
+TREND_SERIES_COLORS = [
+    colors.HexColor(c) for c in
+    ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2')
+]
+TREND_GRID_COLOR = colors.HexColor('#dddddd')
+
+# Fixed styles for the selected-trips PDF, built once at import
+SAMPLE_STYLES = getSampleStyleSheet()
+SELECTED_TRIPS_TITLE_STYLE = ParagraphStyle(
+    'SelTitle', parent=SAMPLE_STYLES['Title'], fontSize=14, spaceAfter=2
+)
+SELECTED_TRIPS_SUB_STYLE = ParagraphStyle(
+    'SelSub', parent=SAMPLE_STYLES['Normal'], fontSize=8,
+    textColor=colors.HexColor('#555555'), spaceAfter=8
+)
+SELECTED_TRIPS_FOOTER_STYLE = ParagraphStyle(
+    'Footer', parent=SAMPLE_STYLES['Normal'], fontSize=7, textColor=colors.grey
+)
+SELECTED_TRIPS_ALT_ROW_BG = colors.HexColor('#eef2f8')
+SELECTED_TRIPS_TABLE_CMDS = (
+    # Header
+    ('BACKGROUND',    (0, 0), (-1, 0),  colors.HexColor('#1a3a6b')),
+    ('TEXTCOLOR',     (0, 0), (-1, 0),  colors.white),
+    ('FONTNAME',      (0, 0), (-1, 0),  'Helvetica-Bold'),
+    ('FONTSIZE',      (0, 0), (-1, 0),  7),
+    ('BOTTOMPADDING', (0, 0), (-1, 0),  4),
+    ('TOPPADDING',    (0, 0), (-1, 0),  4),
+    # Data rows
+    ('FONTNAME',      (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE',      (0, 1), (-1, -1), 7),
+    ('TOPPADDING',    (0, 1), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 3),
+    # Alignment
+    ('ALIGN',         (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN',        (0, 0), (-1, -1), 'MIDDLE'),
+    # Grid
+    ('GRID',          (0, 0), (-1, -1), 0.4, colors.HexColor('#aaaaaa')),
+    ('LINEBELOW',     (0, 0), (-1, 0),  1.0, colors.white),
+)
+
+# One trip in the selected-trips text export: banner, trip number, raw block
+SELECTED_TRIPS_TXT_BLOCK = f"{'=' * 60}\nTRIP #{{}}\n{'=' * 60}\n{{}}\n"
+
 def parse_trips(file_content):
     """Parse the trip file content"""
     trips = []
-    current_trip = []
-    in_trip = False
+    chunk_start = 0
     
-    lines = file_content.split('\n')
-    for line in lines:
-        if 'EFFECTIVE' in line:
-            in_trip = True
-            current_trip = [line]
-        elif in_trip:
-            current_trip.append(line)
-            if line.strip().startswith('---'):
-                trips.append(current_trip)
-                current_trip = []
-                in_trip = False
+    # Each trip runs from its last EFFECTIVE line up to and including the next --- line;
+    # anything after the final --- line is an unterminated trip and is dropped
+    for end_match in TRIP_END_RE.finditer(file_content):
+        if 'EFFECTIVE' in end_match.group():
+            # A header line always opens a trip, even if it starts with ---
+            continue
+        chunk = file_content[chunk_start:end_match.end()]
+        chunk_start = end_match.end()
+        header_pos = chunk.rfind('EFFECTIVE')
+        if header_pos == -1:
+            continue
+        line_start = chunk.rfind('\n', 0, header_pos) + 1
+        trips.append(chunk[line_start:].split('\n'))
     
     return trips
 
-def get_effective_dates(trip_lines, bid_year=2026):
+@lru_cache(maxsize=4)
+def _parsed_trips(file_content):
+    """parse_trips() shared by the per-file preparers, heatmap and detail views"""
+    return tuple(parse_trips(file_content))
+
+def _index_trip(trip_lines):
     """
-    Parse EFFECTIVE date range, days of week, and EXCEPT dates
-    Handles all months (JAN, FEB, MAR, APR, MAY, JUN, JUL, AUG, SEP, OCT, NOV, DEC)
+    One pass over a trip recording the line indices of each landmark
+    (EFFECTIVE, EXCEPT, TOTAL CREDIT, TOTAL PAY, trip number, day letters),
+    the first departure airport and the flight-leg matches on each line,
+    so the field helpers don't each rescan the whole trip
     """
-    header_line = ""
-    except_line = ""
-    
-    for line in trip_lines:
+    index = {
+        'effective': [],
+        'except': [],
+        'total_credit': [],
+        'total_pay': [],
+        'trip_num': [],
+        'day_line_indices': [],
+        'day_letters': [],
+        'first_airport': None,
+        'legs': {},  # line index -> FLIGHT_LEG_RE matches on that line
+    }
+    for i, line in enumerate(trip_lines):
         if 'EFFECTIVE' in line:
-            header_line = line
+            index['effective'].append(i)
         elif 'EXCEPT' in line and 'EXCPT' not in line:
-            except_line = line
+            index['except'].append(i)
+        if 'TOTAL CREDIT' in line:
+            index['total_credit'].append(i)
+        if 'TOTAL PAY' in line:
+            index['total_pay'].append(i)
+        if line.strip().startswith('#'):
+            index['trip_num'].append(i)
+        if len(line) > 3:
+            day_col = line[1:4].strip()
+            if day_col in DAY_LETTERS:
+                index['day_line_indices'].append(i)
+                index['day_letters'].append(day_col)
+                if index['first_airport'] is None and len(line) >= 10:
+                    index['first_airport'] = _first_airport_token(line)
+        if len(line) >= 10:
+            matches = list(FLIGHT_LEG_RE.finditer(line))
+            if matches:
+                index['legs'][i] = matches
+    return index
+
+def get_effective_dates(trip_lines, bid_year=2026, index=None):
+    """
+    Parse EFFECTIVE date range, days of week, and EXCEPT dates
+    Handles all months (JAN, FEB, MAR, APR, MAY, JUN, JUL, AUG, SEP, OCT, NOV, DEC)
+    """
+    if index is None:
+        index = _index_trip(trip_lines)
+    header_line = trip_lines[index['effective'][-1]] if index['effective'] else ""
+    except_line = trip_lines[index['except'][-1]] if index['except'] else ""
     
     if not header_line:
         return [], None, None, 1
     
-    # Month name to number mapping
-    month_map = {
-        'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
-        'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
-    }
-    
+    days_of_week, start_date, end_date, occurrences = _parse_effective_dates(header_line, except_line, bid_year)
+    return list(days_of_week), start_date, end_date, occurrences
+
+@lru_cache(maxsize=4096)
+def _parse_effective_dates(header_line, except_line, bid_year):
+    """
+    Cached parse of one EFFECTIVE/EXCEPT line pair - many trips in a bid
+    packet share the same date block, so repeat headers are a dict lookup
+    """
     # Extract days of week
-    dow_pattern = r'\b(MO|TU|WE|TH|FR|SA|SU)\b'
-    days_of_week = re.findall(dow_pattern, header_line)
-    
-    # Try "MMM## ONLY" pattern (any month)
-    only_match = re.search(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d{1,2})\s+ONLY\b', header_line)
-    if only_match:
-        month_str = only_match.group(1)
-        day = int(only_match.group(2))
-        month_num = month_map[month_str]
+    days_of_week = tuple(DOW_RE.findall(header_line))
+    
+    # One scan covers all three date forms; the named groups say which one matched.
+    # If a line somehow has several, ONLY wins, then cross-month, then same-month
+    date_matches = list(EFFECTIVE_DATES_RE.finditer(header_line))
+    if not date_matches:
+        return days_of_week, None, None, 1
+    date_match = (
+        next((m for m in date_matches if m.group('only')), None)
+        or next((m for m in date_matches if m.group('month2')), None)
+        or date_matches[0]
+    )
+    
+    # "MMM## ONLY" pattern (any month)
+    if date_match.group('only'):
+        month_str = date_match.group('month1')
+        day = int(date_match.group('day1'))
+        month_num = MONTH_ABBR_NUM[month_str]
         
         # Use the provided bid_year
         # For Oct-Dec, use bid_year (e.g., Oct 2025 is in 2025)
@@ -95,50 +313,22 @@ def get_effective_dates(trip_lines, bid_year=2026):
             return days_of_week, None, None, 1
         
         # Verify day of week matches
-        dow_map = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
-        actual_dow = date.weekday()
-        
         if days_of_week:
-            for dow in days_of_week:
-                if dow_map.get(dow) == actual_dow:
-                    return days_of_week, date, date, 1
+            if get_dow_mask(days_of_week) >> date.weekday() & 1:
+                return days_of_week, date, date, 1
             return days_of_week, date, date, 0
         else:
             return days_of_week, date, date, 1
     
-    # Try date range patterns
-    # Pattern 1: MMM##-MMM. ## (e.g., FEB14-MAR. 01)
-    range_match = re.search(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d{1,2})-(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\.\s*(\d{1,2})\b', header_line)
-    
-    if not range_match:
-        # Pattern 2: MMM##-## (same month, e.g., FEB02-FEB. 28 or JAN15-28)
-        range_match = re.search(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d{1,2})-(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\.\s*(\d{1,2})\b', header_line)
-        if not range_match:
-            range_match = re.search(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d{1,2})-(\d{1,2})\b', header_line)
-            if range_match:
-                month_str = range_match.group(1)
-                start_day = int(range_match.group(2))
-                end_day = int(range_match.group(3))
-                month_num = month_map[month_str]
-                year = bid_year  # Use provided bid year
-                
-                try:
-                    start_date = datetime(year, month_num, start_day)
-                    end_date = datetime(year, month_num, end_day)
-                except ValueError:
-                    return days_of_week, None, None, 1
-            else:
-                return days_of_week, None, None, 1
-    
-    if range_match and len(range_match.groups()) == 4:
+    if date_match.group('month2'):
         # Cross-month range (e.g., FEB14-MAR. 01)
-        start_month_str = range_match.group(1)
-        start_day = int(range_match.group(2))
-        end_month_str = range_match.group(3)
-        end_day = int(range_match.group(4))
+        start_month_str = date_match.group('month1')
+        start_day = int(date_match.group('day1'))
+        end_month_str = date_match.group('month2')
+        end_day = int(date_match.group('day2'))
         
-        start_month_num = month_map[start_month_str]
-        end_month_num = month_map[end_month_str]
+        start_month_num = MONTH_ABBR_NUM[start_month_str]
+        end_month_num = MONTH_ABBR_NUM[end_month_str]
         
         # Use provided bid_year
         start_year = bid_year
@@ -153,104 +343,145 @@ def get_effective_dates(trip_lines, bid_year=2026):
             end_date = datetime(end_year, end_month_num, end_day)
         except ValueError:
             return days_of_week, None, None, 1
-    elif not range_match:
-        return days_of_week, None, None, 1
+    else:
+        # Same-month range (e.g., JAN15-28)
+        month_str = date_match.group('month1')
+        start_day = int(date_match.group('day1'))
+        end_day = int(date_match.group('day2'))
+        month_num = MONTH_ABBR_NUM[month_str]
+        year = bid_year  # Use provided bid year
+        
+        try:
+            start_date = datetime(year, month_num, start_day)
+            end_date = datetime(year, month_num, end_day)
+        except ValueError:
+            return days_of_week, None, None, 1
     
     # Count occurrences
-    dow_map = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
-    target_dows = [dow_map[dow] for dow in days_of_week if dow in dow_map]
+    dow_mask = get_dow_mask(days_of_week)
     
-    if not target_dows:
+    if not dow_mask:
         # No specific days of week - every day in range
         occurrences = (end_date - start_date).days + 1
         return days_of_week, start_date, end_date, occurrences
     
-    # Count occurrences of specified days of week
-    occurrence_dates = []
-    current = start_date
-    while current <= end_date:
-        if current.weekday() in target_dows:
-            occurrence_dates.append(current)
-        current += timedelta(days=1)
-    
-    occurrences = len(occurrence_dates)
+    # Count occurrences of specified days of week: each one recurs every 7 days
+    # from its first date in the range
+    start_ord = start_date.toordinal()
+    end_ord = end_date.toordinal()
+    start_dow = start_date.weekday()
+    occurrences = sum(
+        len(range(start_ord + (dow - start_dow) % 7, end_ord + 1, 7))
+        for dow in range(7)
+        if dow_mask >> dow & 1
+    )
     
     # Handle EXCEPT dates
     if except_line:
-        except_dates = []
         # Find all month-day pairs in except line
-        except_matches = re.findall(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\s+(\d{1,2})\b', except_line)
+        except_matches = EXCEPT_RE.findall(except_line)
         for month_str, day in except_matches:
-            month_num = month_map[month_str]
+            month_num = MONTH_ABBR_NUM[month_str]
             year = 2025 if month_num >= 10 else 2026
             
             try:
                 except_date = datetime(year, month_num, int(day))
-                if except_date in occurrence_dates:
-                    occurrences -= 1
             except ValueError:
-                pass
+                continue
+            if (start_ord <= except_date.toordinal() <= end_ord
+                    and dow_mask >> except_date.weekday() & 1):
+                occurrences -= 1
     
     return days_of_week, start_date, end_date, occurrences
 
+def get_dow_mask(days_of_week):
+    """Pack day-of-week codes (MO..SU) into a 7-bit mask, bit 0 = Monday"""
+    dow_mask = 0
+    for dow in days_of_week:
+        if dow in DOW_INDEX:
+            dow_mask |= 1 << DOW_INDEX[dow]
+    return dow_mask
+
+def get_occurrence_ordinals(start_date, end_date, dow_mask):
+    """
+    Date ordinals from start_date to end_date (inclusive) falling on any
+    weekday set in dow_mask (see get_dow_mask), or every date if it is 0.
+    Steps through each weekday by 7 using ordinals instead of walking every day.
+    """
+    start_ord = start_date.toordinal()
+    end_ord = end_date.toordinal()
+    if not dow_mask:
+        ordinals = range(start_ord, end_ord + 1)
+    else:
+        start_dow = start_date.weekday()
+        ordinals = sorted(
+            o
+            for dow in range(7)
+            if dow_mask >> dow & 1
+            for o in range(start_ord + (dow - start_dow) % 7, end_ord + 1, 7)
+        )
+    return ordinals
+
 def generate_staffing_heatmap(file_content, bid_month, bid_year, base_filter="All Bases"):
     """
     Generate daily staffing heat map data showing number of pilots working each day
     Returns dict with dates, pilot counts, and trip details
     """
-    trips = parse_trips(file_content)
+    trips = _parsed_trips(file_content)
+    
+    month_num = MONTH_NAME_NUM.get(bid_month, 1)
+    
+    # Get days in month
+    import calendar
+    import numpy as np
+    days_in_month = calendar.monthrange(bid_year, month_num)[1]
+    month_start_ord = datetime(bid_year, month_num, 1).toordinal()
     
-    # Month name to number mapping
-    month_map = {
-        'January': 1, 'February': 2, 'March': 3, 'April': 4,
-        'May': 5, 'June': 6, 'July': 7, 'August': 8,
-        'September': 9, 'October': 10, 'November': 11, 'December': 12
+    # Year for each EXCEPT month - Jan-Sep exceptions on an Oct-Dec bid fall in the next year
+    except_year_for = {
+        m: bid_year + 1 if (m < month_num and month_num >= 10) else bid_year
+        for m in range(1, 13)
     }
     
-    month_num = month_map.get(bid_month, 1)
+    # One entry per surviving occurrence across all trips, expanded into
+    # duty days in a single array pass once every trip has been parsed
+    occ_ords = []
+    occ_lengths = []
+    occ_trips = []  # (trip_number, duty_days) for each occurrence
     
-    # Dictionary to store: date -> list of (trip_number, duty_day)
-    date_operations = {}
+    filter_by_base = base_filter != "All Bases"
     
     for trip in trips:
+        # Apply base filter first - it only needs the first duty-day line, so
+        # trips from other bases skip the header/date parsing entirely
+        first_airport = get_first_departure_airport(trip)
+        if not first_airport:
+            continue
+        if filter_by_base and BASE_MAPPING.get(first_airport, 'UNKNOWN') != base_filter:
+            continue
+        
+        index = _index_trip(trip)
+        
         # Get trip number
         trip_number = None
-        for line in trip:
-            if line.strip().startswith('#'):
-                match = re.search(r'#(\d+)', line)
-                if match:
-                    trip_number = match.group(1)
-                    break
+        for i in index['trip_num']:
+            match = NUMERIC_TRIP_NUM_RE.search(trip[i])
+            if match:
+                trip_number = match.group(1)
+                break
         
         if not trip_number:
             continue
         
-        # Apply base filter
-        first_airport = get_first_departure_airport(trip)
-        if not first_airport:
-            continue
-        base = BASE_MAPPING.get(first_airport, 'UNKNOWN')
-        if base_filter != "All Bases" and base != base_filter:
-            continue
-        
         # Get effective dates and EXCEPT dates
-        header_line = ""
-        except_line = ""
-        for line in trip:
-            if 'EFFECTIVE' in line:
-                header_line = line
-            elif 'EXCEPT' in line and 'EXCPT' not in line:
-                except_line = line
+        header_line = trip[index['effective'][-1]] if index['effective'] else ""
+        except_line = trip[index['except'][-1]] if index['except'] else ""
         
         if not header_line:
             continue
         
-        # Parse days of week
-        dow_pattern = r'\b(MO|TU|WE|TH|FR|SA|SU)\b'
-        days_of_week = re.findall(dow_pattern, header_line)
-        
-        # Get start and end dates
-        days_of_week_parsed, start_date, end_date, _ = get_effective_dates(trip, bid_year)
+        # Get days of week, start and end dates
+        days_of_week_parsed, start_date, end_date, _ = get_effective_dates(trip, bid_year, index)
         
         if not start_date or not end_date:
             continue
@@ -258,7 +489,7 @@ def generate_staffing_heatmap(file_content, bid_month, bid_year, base_filter="Al
         # Get trip length (number of duty days A, B, C, D, etc.)
         duty_days = []
         for line in trip:
-            match = re.match(r'\s+([A-Z])\s+\d+', line)
+            match = DAY_COL_RE.match(line)
             if match:
                 duty_day = match.group(1)
                 if duty_day not in duty_days:
@@ -269,56 +500,47 @@ def generate_staffing_heatmap(file_content, bid_month, bid_year, base_filter="Al
             continue
         
         # Get all dates this trip operates on
-        dow_map = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
-        target_dows = [dow_map[dow] for dow in days_of_week_parsed if dow in dow_map]
+        dow_mask = get_dow_mask(days_of_week_parsed)
         
-        # Collect exception dates
+        # Collect exception dates (as ordinals)
         except_dates = set()
         if except_line:
-            month_abbr_map = {
-                'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
-                'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
-            }
-            except_matches = re.findall(r'\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\s+(\d{1,2})\b', except_line)
+            except_matches = EXCEPT_RE.findall(except_line)
             for month_str, day in except_matches:
-                except_month_num = month_abbr_map[month_str]
-                # Determine year based on month
-                except_year = bid_year if except_month_num >= 10 else bid_year
-                if except_month_num < month_num and month_num >= 10:
-                    except_year = bid_year + 1
+                except_month_num = MONTH_ABBR_NUM[month_str]
+                except_year = except_year_for[except_month_num]
                 try:
-                    except_date = datetime(except_year, except_month_num, int(day))
-                    except_dates.add(except_date)
+                    except_dates.add(datetime(except_year, except_month_num, int(day)).toordinal())
                 except ValueError:
                     pass
         
         # Find all occurrence dates
-        occurrence_dates = []
-        current = start_date
-        while current <= end_date:
-            if not target_dows or current.weekday() in target_dows:
-                if current not in except_dates:
-                    occurrence_dates.append(current)
-            current += timedelta(days=1)
+        occurrence_ords = [
+            occ_ord for occ_ord in get_occurrence_ordinals(start_date, end_date, dow_mask)
+            if occ_ord not in except_dates
+        ]
         
-        # For each occurrence date, add all duty days
-        for occ_date in occurrence_dates:
-            for i, duty_day in enumerate(duty_days):
-                duty_date = occ_date + timedelta(days=i)
-                
-                # Only include dates in the bid month
-                if duty_date.month == month_num and duty_date.year == bid_year:
-                    if duty_date not in date_operations:
-                        date_operations[duty_date] = []
-                    date_operations[duty_date].append({
-                        'trip_number': trip_number,
-                        'duty_day': duty_day,
-                        'trip_length': trip_length
-                    })
-    
-    # Get days in month
-    import calendar
-    days_in_month = calendar.monthrange(bid_year, month_num)[1]
+        if not occurrence_ords:
+            continue
+        
+        occ_ords.extend(occurrence_ords)
+        occ_lengths.extend([trip_length] * len(occurrence_ords))
+        occ_trips.extend([(trip_number, duty_days)] * len(occurrence_ords))
+    
+    # Day-of-month index for every (occurrence, duty day) pair; only
+    # pairs landing inside the bid month are counted
+    occ_lengths = np.array(occ_lengths, dtype=np.int64)
+    pair_occ = np.repeat(np.arange(len(occ_lengths)), occ_lengths)
+    pair_col = np.arange(len(pair_occ)) - np.repeat(np.cumsum(occ_lengths) - occ_lengths, occ_lengths)
+    day_idx = np.array(occ_ords, dtype=np.int64)[pair_occ] - month_start_ord + pair_col
+    in_month = (day_idx >= 0) & (day_idx < days_in_month)
+    
+    # Pilots working per day of the bid month, plus trip_number -> duty days per day
+    counts = np.bincount(day_idx[in_month], minlength=days_in_month)
+    day_operations = [defaultdict(set) for _ in range(days_in_month)]
+    for idx, occ, duty_col in zip(day_idx[in_month].tolist(), pair_occ[in_month].tolist(), pair_col[in_month].tolist()):
+        trip_number, duty_days = occ_trips[occ]
+        day_operations[idx][trip_number].add(duty_days[duty_col])
     
     # Create arrays for heat map
     dates = []
@@ -326,25 +548,18 @@ def generate_staffing_heatmap(file_content, bid_month, bid_year, base_filter="Al
     trip_details = []
     
     for day in range(1, days_in_month + 1):
-        date = datetime(bid_year, month_num, day)
-        dates.append(date)
+        dates.append(datetime.fromordinal(month_start_ord + day - 1))
         
-        if date in date_operations:
-            count = len(date_operations[date])
+        count = int(counts[day - 1])
+        if count:
             pilot_counts.append(count)
             
             # Create detail string
-            trip_nums = {}  # trip_number -> list of duty days
-            for op in date_operations[date]:
-                trip_num = op['trip_number']
-                duty_day = op['duty_day']
-                if trip_num not in trip_nums:
-                    trip_nums[trip_num] = []
-                trip_nums[trip_num].append(duty_day)
+            trip_nums = day_operations[day - 1]  # trip_number -> set of duty days
             
             detail_lines = []
-            for trip_num in sorted(trip_nums.keys(), key=lambda x: int(x) if x.isdigit() else 0):
-                duty_days_str = ', '.join(sorted(set(trip_nums[trip_num])))
+            for trip_num in sorted(trip_nums, key=lambda x: int(x) if x.isdigit() else 0):
+                duty_days_str = ', '.join(sorted(trip_nums[trip_num]))
                 detail_lines.append(f"#{trip_num} ({duty_days_str})")
             
             trip_details.append('<br>'.join(detail_lines[:10]))  # Limit to first 10 for readability
@@ -362,26 +577,19 @@ def generate_staffing_heatmap(file_content, bid_month, bid_year, base_filter="Al
 
 def get_previous_month_abbr(bid_month):
     """Get the 3-letter abbreviation for the previous month"""
-    prev_month_map = {
-        'January': 'DEC', 'February': 'JAN', 'March': 'FEB',
-        'April': 'MAR', 'May': 'APR', 'June': 'MAY',
-        'July': 'JUN', 'August': 'JUL', 'September': 'AUG',
-        'October': 'SEP', 'November': 'OCT', 'December': 'NOV'
-    }
-    return prev_month_map.get(bid_month, '')
+    return PREV_MONTH_ABBR[MONTH_NAME_NUM.get(bid_month, 0)]
 
-def is_split_trip(trip_lines, bid_month):
+def is_split_trip(trip_lines, bid_month, index=None):
     """
     Detect if this is a split trip:
     1. EFFECTIVE line contains previous month abbreviation
     2. Day sequence has repeating day letters
     """
+    if index is None:
+        index = _index_trip(trip_lines)
+    
     # Get EFFECTIVE line
-    effective_line = ""
-    for line in trip_lines:
-        if 'EFFECTIVE' in line:
-            effective_line = line
-            break
+    effective_line = trip_lines[index['effective'][0]] if index['effective'] else ""
     
     if not effective_line:
         return False
@@ -391,22 +599,16 @@ def is_split_trip(trip_lines, bid_month):
     if not prev_month or prev_month not in effective_line:
         return False
     
-    # Check for repeating day letters
-    day_letters = []
-    for line in trip_lines:
-        if len(line) > 3:
-            day_col = line[1:4].strip()
-            if day_col in ['A', 'B', 'C', 'D', 'E']:
-                day_letters.append(day_col)
-    
     # If any day letter appears more than once, it's a split
-    from collections import Counter
-    day_count = Counter(day_letters)
-    has_repeat = any(count > 1 for count in day_count.values())
+    seen = set()
+    for day_col in index['day_letters']:
+        if day_col in seen:
+            return True
+        seen.add(day_col)
     
-    return has_repeat
+    return False
 
-def split_trip_into_sections(trip_lines):
+def split_trip_into_sections(trip_lines, index=None):
     """
     Split a trip into two sections at the point where day letters restart
     Section 1: Everything up to (but not including) the first repeated day + TOTAL CREDIT/PAY
@@ -414,25 +616,22 @@ def split_trip_into_sections(trip_lines):
     
     Returns: (section1_lines, section2_lines, split_index)
     """
-    day_letters = []
-    day_line_indices = []
-    
-    for i, line in enumerate(trip_lines):
-        if len(line) > 3:
-            day_col = line[1:4].strip()
-            if day_col in ['A', 'B', 'C', 'D', 'E']:
-                day_letters.append(day_col)
-                day_line_indices.append(i)
+    if index is None:
+        index = _index_trip(trip_lines)
+    day_letters = index['day_letters']
+    day_line_indices = index['day_line_indices']
     
     if not day_letters:
         return trip_lines, [], -1
     
     # Find where first day repeats
     split_index = -1
-    for i in range(1, len(day_letters)):
-        if day_letters[i] in day_letters[:i]:
+    seen = set()
+    for i, day_col in enumerate(day_letters):
+        if day_col in seen:
             split_index = day_line_indices[i]
             break
+        seen.add(day_col)
     
     if split_index == -1:
         return trip_lines, [], -1
@@ -441,14 +640,15 @@ def split_trip_into_sections(trip_lines):
     section1 = trip_lines[:split_index]
     
     # Add TOTAL CREDIT and TOTAL PAY lines to section 1
-    for line in trip_lines[split_index:]:
-        if 'TOTAL CREDIT' in line or 'TOTAL PAY' in line:
-            section1.append(line)
+    total_indices = sorted(set(index['total_credit']) | set(index['total_pay']))
+    for i in total_indices:
+        if i >= split_index:
+            section1.append(trip_lines[i])
     
     # Section 2: From split point to TOTAL CREDIT (excluding it)
     section2_end = len(trip_lines)
-    for i in range(split_index, len(trip_lines)):
-        if 'TOTAL CREDIT' in trip_lines[i]:
+    for i in index['total_credit']:
+        if i >= split_index:
             section2_end = i
             break
     
@@ -466,23 +666,15 @@ def calculate_credit_for_section(trip_lines):
     Calculate credit for a trip section without TOTAL CREDIT line
     Credit = max(sum of BLK times, 5.15 * number of days)
     """
-    # Get all BLK times
-    block_times = get_flight_block_times(trip_lines)
-    
-    # Convert H.MM to decimal hours
-    def hmm_to_decimal(hmm):
-        hours = int(hmm)
-        minutes = int(round((hmm - hours) * 100))
-        return hours + (minutes / 60.0)
-    
-    total_blk = sum(hmm_to_decimal(blk) for blk in block_times)
+    # Sum of all BLK times in decimal hours
+    _, total_blk, _, _ = get_flight_block_stats(trip_lines)
     
     # Count unique days
     day_letters = []
     for line in trip_lines:
         if len(line) > 3:
             day_col = line[1:4].strip()
-            if day_col in ['A', 'B', 'C', 'D', 'E'] and day_col not in day_letters:
+            if day_col in DAY_LETTERS and day_col not in day_letters:
                 day_letters.append(day_col)
     
     num_days = len(day_letters)
@@ -491,22 +683,25 @@ def calculate_credit_for_section(trip_lines):
     # Return the higher value
     return max(total_blk, min_daily_credit)
 
-def get_trip_number(trip_lines):
+def get_trip_number(trip_lines, index=None):
     """Extract trip number from trip header - can be numeric or alphanumeric (e.g., 4527 or L832)"""
-    for line in trip_lines:
-        if line.strip().startswith('#'):
-            # Extract trip number after # - can include letters
-            # Pattern: #L832 or #4527
-            match = re.search(r'#([A-Z]?\d+)', line)
-            if match:
-                return match.group(1)
+    if index is None:
+        index = _index_trip(trip_lines)
+    for i in index['trip_num']:
+        # Extract trip number after # - can include letters
+        # Pattern: #L832 or #4527
+        match = TRIP_NUM_RE.search(trip_lines[i])
+        if match:
+            return match.group(1)
     return None
 
-def get_total_pay(trip_lines):
+def get_total_pay(trip_lines, index=None):
     """
     Extract TOTAL PAY components - handles H:MM format and converts to decimal hours
     Returns dict with total_pay, sit, edp, hol, carve
     """
+    if index is None:
+        index = _index_trip(trip_lines)
     pay_dict = {
         'total_pay': None,
         'sit': None,
@@ -515,124 +710,114 @@ def get_total_pay(trip_lines):
         'carve': None
     }
     
-    for line in trip_lines:
-        if 'TOTAL PAY' in line:
-            parts = line.split()
-            
-            # Find each component
-            for i, part in enumerate(parts):
-                if part == 'PAY' and i + 1 < len(parts):
-                    pay_str = parts[i + 1]
-                    if pay_str.endswith('TL'):
-                        pay_str = pay_str[:-2]
-                    pay_dict['total_pay'] = parse_time_to_decimal(pay_str)
-                
-                elif part.endswith('SIT') and i < len(parts):
-                    sit_str = part[:-3]  # Remove 'SIT'
-                    try:
-                        pay_dict['sit'] = float(sit_str)
-                    except ValueError:
-                        pass
-                
-                elif part.endswith('EDP') and i < len(parts):
-                    edp_str = part[:-3]  # Remove 'EDP'
-                    try:
-                        pay_dict['edp'] = float(edp_str)
-                    except ValueError:
-                        pass
-                
-                elif part.endswith('HOL') and i < len(parts):
-                    hol_str = part[:-3]  # Remove 'HOL'
-                    try:
-                        pay_dict['hol'] = float(hol_str)
-                    except ValueError:
-                        pass
-                
-                elif part.endswith('CARVE'):
-                    carve_str = part[:-5]  # Remove 'CARVE'
-                    try:
-                        pay_dict['carve'] = float(carve_str)
-                    except ValueError:
-                        pass
-            break
+    if index['total_pay']:
+        # Find each component
+        for match in TOTAL_PAY_RE.finditer(trip_lines[index['total_pay'][0]]):
+            pay_str = match.group('pay')
+            if pay_str is not None:
+                if pay_str.endswith('TL'):
+                    pay_str = pay_str[:-2]
+                pay_dict['total_pay'] = parse_time_to_decimal(pay_str)
+            else:
+                try:
+                    pay_dict[match.group('field').lower()] = float(match.group('value'))
+                except ValueError:
+                    pass
     
     return pay_dict
 
 def parse_time_to_decimal(time_str):
     """Convert H:MM format or decimal to decimal hours"""
-    if ':' in time_str:
-        try:
-            time_parts = time_str.split(':')
-            if len(time_parts) == 2:
-                hours = int(time_parts[0])
-                minutes = int(time_parts[1])
-                return hours + (minutes / 60.0)
-        except ValueError:
-            pass
-    else:
-        try:
+    try:
+        # Common case: H:MM / HH:MM - slice around the colon instead of splitting
+        if len(time_str) >= 3 and time_str[-3] == ':':
+            return int(time_str[:-3]) + (int(time_str[-2:]) / 60.0)
+        if ':' not in time_str:
             return float(time_str)
-        except ValueError:
-            pass
+        time_parts = time_str.split(':')
+        if len(time_parts) == 2:
+            hours = int(time_parts[0])
+            minutes = int(time_parts[1])
+            return hours + (minutes / 60.0)
+    except ValueError:
+        pass
     return None
 
-def get_flight_block_times(trip_lines):
+@lru_cache(maxsize=4096)
+def _block_time_minutes(tokens):
     """
-    Extract all flight block times (BLK column) - returns list in H.MM format
-    Note: Format is H.MM (e.g., 2.37 = 2 hours 37 minutes, NOT 2.37 decimal hours)
-    We keep them as-is since the format already represents H:MM with a period separator
+    Block time in minutes from the tokens after a leg's arrival time, or None
+    The first token with a '.' that reads as 0.1-15.0 hours (H.MM) is the block time
     """
-    block_times = []
-    
-    for line in trip_lines:
-        if len(line) < 10:
-            continue
-        
-        # Look for flight lines with departure/arrival pattern
-        # Format: airport time airport time H.MM
-        # The H.MM number after the second airport/time is the block time
-        parts = line.split()
-        
-        for i in range(len(parts) - 1):
-            # Look for pattern: AIRPORT(3 letters) TIME(4 digits) then a H.MM number
-            if (i >= 2 and 
-                len(parts[i-2]) == 3 and parts[i-2].isalpha() and  # departure airport
-                len(parts[i-1]) == 4 and parts[i-1].isdigit() and  # departure time
-                len(parts[i]) == 3 and parts[i].isalpha() and      # arrival airport
-                i + 1 < len(parts)):
-                
-                # Next part should be arrival time (4 digits possibly with *)
-                arr_time = parts[i+1].rstrip('*')
-                if len(arr_time) == 4 and arr_time.isdigit():
-                    # Look for block time in next few positions
-                    # Block time is H.MM format like 2.37, 4.57, etc.
-                    for j in range(i+2, min(i+5, len(parts))):
-                        part = parts[j]
-                        # Check if this is a H.MM number (block time)
-                        if '.' in part:
-                            try:
-                                block_time = float(part)
-                                # Block times are typically between 0.5 and 15 hours
-                                # Note: these are stored as H.MM (e.g., 2.37) which we keep as-is
-                                if 0.1 <= block_time <= 15.0:
-                                    block_times.append(block_time)
-                                    break
-                            except ValueError:
-                                continue
-    
-    return block_times
-
-def extract_detailed_trip_info(trip_lines):
+    for token in tokens.split():
+        if '.' in token:
+            try:
+                block_time = float(token)
+            except ValueError:
+                continue
+            if 0.1 <= block_time <= 15.0:
+                hours = int(block_time)
+                return hours * 60 + int(round((block_time - hours) * 100))
+    return None
+
+def get_flight_block_stats(trip_lines, index=None):
+    """
+    Summarise all flight block times (BLK column) in one pass
+    Block times are printed as H.MM (e.g., 2.37 = 2 hours 37 minutes) and are
+    read straight into integer minutes
+    Returns (count, total, shortest, longest) - total is in decimal hours,
+    shortest/longest are in minutes
+    Returns (0, 0.0, None, None) if the trip has no legs
+    """
+    if index is None:
+        index = _index_trip(trip_lines)
+    count = 0
+    total_minutes = 0
+    shortest = None
+    longest = None
+    
+    # Format: airport time airport time H.MM
+    # The H.MM number within a few columns of the arrival time is the block time.
+    # As in the original scanner, a leg needs a plain (unstarred) departure time,
+    # and legs chained on one line overlap
+    block_tokens = []
+    for matches in index['legs'].values():
+        for match in matches:
+            line = match.string
+            if line[match.end(2)] != '*':
+                block_tokens.append(match.group(5))
+            if line[match.end(4):match.end(4) + 1] != '*':
+                chained = CHAINED_LEG_RE.match(line, match.end(4))
+                if chained:
+                    block_tokens.append(chained.group(1))
+    
+    for tokens in block_tokens:
+        block_minutes = _block_time_minutes(tokens)
+        if block_minutes is not None:
+            count += 1
+            total_minutes += block_minutes
+            if shortest is None or block_minutes < shortest:
+                shortest = block_minutes
+            if longest is None or block_minutes > longest:
+                longest = block_minutes
+    
+    if count == 0:
+        return 0, 0.0, None, None
+    return count, total_minutes / 60.0, shortest, longest
+
+def extract_detailed_trip_info(trip_lines, index=None):
     """
     Extract all information needed for detailed trip table view
     Returns dict with trip details
     """
-    trip_number = get_trip_number(trip_lines)
-    first_airport = get_first_departure_airport(trip_lines)
+    if index is None:
+        index = _index_trip(trip_lines)
+    trip_number = get_trip_number(trip_lines, index)
+    first_airport = get_first_departure_airport(trip_lines, index)
     base = BASE_MAPPING.get(first_airport, 'UNKNOWN') if first_airport else 'UNKNOWN'
     
     # Get trip length and flight legs
-    length, last_day_legs, flight_legs = determine_trip_length_with_details(trip_lines)
+    length, last_day_legs, flight_legs = determine_trip_length_with_details(trip_lines, index)
     
     # Calculate report and release times
     report_time_minutes = None
@@ -655,38 +840,33 @@ def extract_detailed_trip_info(trip_lines):
     release_time_str = minutes_to_time(release_time_minutes)
     
     # Get total credit and pay components
-    total_credit = get_total_credit(trip_lines)
-    pay_data = get_total_pay(trip_lines)
-    
-    # Get block times for longest/shortest leg (in H.MM format)
-    block_times = get_flight_block_times(trip_lines)
-    longest_leg = max(block_times) if block_times else 0  # H.MM format
-    shortest_leg = min(block_times) if block_times else 0  # H.MM format
-    
-    # Convert H.MM format to HH:MM display format
-    # Example: 2.37 means 2 hours 37 minutes
-    def hmm_to_display(time_val):
-        if time_val == 0:
-            return "0:00"
-        # Split the float: integer part is hours, decimal part is minutes
-        hours = int(time_val)
-        minutes = int(round((time_val - hours) * 100))  # .37 becomes 37 minutes
+    total_credit = get_total_credit(trip_lines, index)
+    pay_data = get_total_pay(trip_lines, index)
+    
+    # Get block times for longest/shortest leg (in minutes)
+    leg_count, _, shortest_leg, longest_leg = get_flight_block_stats(trip_lines, index)
+    if leg_count == 0:
+        shortest_leg = longest_leg = 0
+    
+    # Convert minutes to H:MM display format
+    def minutes_to_display(total_minutes):
+        hours, minutes = divmod(total_minutes, 60)
         return f"{hours}:{minutes:02d}"
     
-    longest_leg_str = hmm_to_display(longest_leg)
-    shortest_leg_str = hmm_to_display(shortest_leg)
+    longest_leg_str = minutes_to_display(longest_leg)
+    shortest_leg_str = minutes_to_display(shortest_leg)
     
     # Check if trip has red-eye
     has_redeye = has_redeye_flight(flight_legs)
     
     # Check if last leg is a deadhead
-    last_leg_dh = get_last_leg_is_dh(trip_lines)
+    last_leg_dh = get_last_leg_is_dh(trip_lines, index)
     
     # Get credit components (BL and CR)
-    credit_components = get_credit_components(trip_lines)
+    credit_components = get_credit_components(trip_lines, index)
     
     # Get days of week and effective dates
-    days_of_week, start_date, end_date, occurrences = get_effective_dates(trip_lines)
+    days_of_week, start_date, end_date, occurrences = get_effective_dates(trip_lines, index=index)
     
     # Get raw trip text
     raw_text = '\n'.join(trip_lines)
@@ -717,62 +897,62 @@ def extract_detailed_trip_info(trip_lines):
         'raw_text': raw_text
     }
 
-def get_first_departure_airport(trip_lines):
+def get_first_departure_airport(trip_lines, index=None):
     """Get the departure airport of the first flight"""
+    if index is not None:
+        return index['first_airport']
+    # Without an index, stop at the first duty-day line that has one
     for line in trip_lines:
         if len(line) < 10:
             continue
         day_col = line[1:4].strip()
-        if day_col in ['A', 'B', 'C', 'D', 'E']:
-            parts = line.split()
-            for part in parts:
-                if len(part) == 3 and part.isalpha() and part.isupper():
-                    return part
+        if day_col in DAY_LETTERS:
+            airport = _first_airport_token(line)
+            if airport:
+                return airport
     return None
 
-def determine_trip_length_with_details(trip_lines):
+def _first_airport_token(line):
+    """First 3-letter uppercase token on a duty-day line, or None"""
+    for part in line.split():
+        if len(part) == 3 and part.isalpha() and part.isupper():
+            return part
+    return None
+
+def _file_has_base(file_content, base_filter):
+    """False only when no airport of base_filter appears anywhere in the file"""
+    pattern = BASE_AIRPORT_RE.get(base_filter)
+    return pattern is None or pattern.search(file_content) is not None
+
+def determine_trip_length_with_details(trip_lines, index=None):
     """Determine trip length, legs on last day, all flight legs"""
+    if index is None:
+        index = _index_trip(trip_lines)
     last_day_letter = None
     current_day_letter = None
     legs_by_day = {}
     flight_legs = []
     
-    for line in trip_lines:
+    # Only day-letter lines and flight lines matter, in trip order
+    for i in sorted(set(index['day_line_indices']).union(index['legs'])):
+        line = trip_lines[i]
         if len(line) < 10:
             continue
         
         day_col = line[1:4].strip()
-        if day_col in ['A', 'B', 'C', 'D', 'E']:
+        if day_col in DAY_LETTERS:
             last_day_letter = day_col
             current_day_letter = day_col
             if current_day_letter not in legs_by_day:
                 legs_by_day[current_day_letter] = 0
         
         if len(line) > 30:
-            parts = line.split()
-            i = 0
-            while i < len(parts) - 3:
-                part1 = parts[i]
-                part2 = parts[i+1].rstrip('*')
-                part3 = parts[i+2]
-                part4 = parts[i+3].rstrip('*')
-                
-                if (len(part1) == 3 and part1.isalpha() and
-                    len(part2) == 4 and part2.isdigit() and
-                    len(part3) == 3 and part3.isalpha() and
-                    len(part4) == 4 and part4.isdigit()):
-                    
-                    dep_time = part2
-                    arr_time = part4
-                    flight_legs.append((part1, dep_time, part3, arr_time))
-                    if current_day_letter:
-                        legs_by_day[current_day_letter] += 1
-                    i += 4
-                else:
-                    i += 1
-    
-    day_to_length = {'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5}
-    num_days = day_to_length.get(last_day_letter, 0)
+            for match in index['legs'].get(i, ()):
+                flight_legs.append(match.group(1, 2, 3, 4))
+                if current_day_letter:
+                    legs_by_day[current_day_letter] += 1
+    
+    num_days = DAY_LETTER_LENGTH.get(last_day_letter, 0)
     last_day_legs = legs_by_day.get(last_day_letter, 0)
     
     # Check for red-eye on last leg
@@ -788,52 +968,53 @@ def determine_trip_length_with_details(trip_lines):
     
     return num_days, last_day_legs, flight_legs
 
-def get_total_credit(trip_lines):
+def get_total_credit(trip_lines, index=None):
     """Extract TOTAL CREDIT value"""
-    for line in trip_lines:
-        if 'TOTAL CREDIT' in line:
-            parts = line.split()
-            for i, part in enumerate(parts):
-                if part == 'CREDIT' and i + 1 < len(parts):
-                    credit_str = parts[i + 1]
-                    if credit_str.endswith('TL'):
-                        try:
-                            return float(credit_str[:-2])
-                        except ValueError:
-                            pass
+    if index is None:
+        index = _index_trip(trip_lines)
+    for line_idx in index['total_credit']:
+        parts = trip_lines[line_idx].split()
+        for i, part in enumerate(parts):
+            if part == 'CREDIT' and i + 1 < len(parts):
+                credit_str = parts[i + 1]
+                if credit_str.endswith('TL'):
+                    try:
+                        return float(credit_str[:-2])
+                    except ValueError:
+                        pass
     return None
 
-def get_credit_components(trip_lines):
+def get_credit_components(trip_lines, index=None):
     """
     Extract BL (block) and CR (credit) components from TOTAL CREDIT line
     Returns dict with 'block' and 'credit' values in decimal hours (for block) and minutes (for credit)
     
     Example line: TOTAL CREDIT 10.30TL   7.49BL    2.41CR
     """
+    if index is None:
+        index = _index_trip(trip_lines)
     components = {'block': None, 'credit': None}
     
-    for line in trip_lines:
-        if 'TOTAL CREDIT' in line:
-            parts = line.split()
-            for i, part in enumerate(parts):
-                if part.endswith('BL'):
-                    bl_str = part[:-2]
-                    try:
-                        components['block'] = float(bl_str)
-                    except ValueError:
-                        pass
-                elif part.endswith('CR'):
-                    cr_str = part[:-2]
-                    try:
-                        # Convert decimal hours to minutes for filtering
-                        # 2.41 hours = 2 hours 41 minutes = 141 minutes
-                        cr_hours = float(cr_str)
-                        cr_whole_hours = int(cr_hours)
-                        cr_decimal_minutes = int(round((cr_hours - cr_whole_hours) * 100))
-                        components['credit'] = cr_whole_hours * 60 + cr_decimal_minutes
-                    except ValueError:
-                        pass
-            break
+    if index['total_credit']:
+        parts = trip_lines[index['total_credit'][0]].split()
+        for i, part in enumerate(parts):
+            if part.endswith('BL'):
+                bl_str = part[:-2]
+                try:
+                    components['block'] = float(bl_str)
+                except ValueError:
+                    pass
+            elif part.endswith('CR'):
+                cr_str = part[:-2]
+                try:
+                    # Convert decimal hours to minutes for filtering
+                    # 2.41 hours = 2 hours 41 minutes = 141 minutes
+                    cr_hours = float(cr_str)
+                    cr_whole_hours = int(cr_hours)
+                    cr_decimal_minutes = int(round((cr_hours - cr_whole_hours) * 100))
+                    components['credit'] = cr_whole_hours * 60 + cr_decimal_minutes
+                except ValueError:
+                    pass
     
     return components
 
@@ -848,217 +1029,277 @@ def has_redeye_flight(flight_legs):
     Early morning same-day departures (05:45, 06:00) are NOT red-eyes.
     """
     for dep_airport, dep_time, arr_airport, arr_time in flight_legs:
-        try:
-            # Parse times (handle * for next day arrival)
-            dep_hour = int(dep_time[:2])
-            dep_min = int(dep_time[2:4]) if len(dep_time) >= 4 else 0
-            arr_time_clean = arr_time.rstrip('*')
-            arr_hour = int(arr_time_clean[:2])
-            arr_min = int(arr_time_clean[2:4]) if len(arr_time_clean) >= 4 else 0
-            
-            # Convert to minutes since midnight
-            dep_minutes = dep_hour * 60 + dep_min
-            arr_minutes = arr_hour * 60 + arr_min
-            
-            # WOCL window: 02:00 to 05:59
-            wocl_start = 2 * 60  # 120 minutes (02:00)
-            wocl_end = 5 * 60 + 59  # 359 minutes (05:59)
-            
-            # A red-eye MUST be an overnight flight
-            # Overnight = has * OR departs after 18:00 with early morning arrival
-            is_overnight = '*' in arr_time
-            
-            # Additional overnight check for flights without * marker
-            if not is_overnight:
-                # If departs evening (18:00+) and arrives early morning (before 12:00)
-                if dep_minutes >= 18 * 60 and arr_minutes < 12 * 60:
-                    is_overnight = True
-            
-            # Only check WOCL for overnight flights
-            if is_overnight:
-                # Red-eye if arrival is during WOCL (02:00-05:59)
-                if wocl_start <= arr_minutes <= wocl_end:
-                    return True
-                # Also catches flights that depart late (20:00+) and arrive shortly after WOCL (06:00-08:00)
-                # These still intrude WOCL while airborne
-                if dep_minutes >= 20 * 60 and wocl_start <= arr_minutes <= 8 * 60:
-                    return True
-            
-            # Explicitly ignore early morning same-day flights
-            # (e.g., 05:45 departure is just an early start, not a red-eye)
-                    
-        except (ValueError, IndexError):
-            continue
-    
+        if _is_redeye_leg(dep_time, arr_time):
+            return True
     return False
 
-def calculate_report_time(first_dep_time):
-    """Calculate report time = first departure - 60 minutes"""
+@lru_cache(maxsize=4096)
+def _is_redeye_leg(dep_time, arr_time):
+    """
+    Red-eye test for one leg's HHMM departure/arrival strings - the same
+    departure/arrival pairs repeat across a bid packet, so this is cached
+    """
     try:
-        hour = int(first_dep_time[:2])
-        minute = int(first_dep_time[2:4])
-        total_minutes = hour * 60 + minute - 60
-        if total_minutes < 0:
-            total_minutes += 1440
-        return total_minutes
+        # Parse times to minutes since midnight (handle * for next day arrival)
+        dep_minutes = int(dep_time[:2]) * 60 + (int(dep_time[2:4]) if len(dep_time) >= 4 else 0)
+        arr_time_clean = arr_time.rstrip('*')
+        arr_minutes = int(arr_time_clean[:2]) * 60 + (int(arr_time_clean[2:4]) if len(arr_time_clean) >= 4 else 0)
     except (ValueError, IndexError):
+        return False
+    
+    # A red-eye MUST be an overnight flight
+    # Overnight = has * OR departs evening (18:00+) and arrives early morning (before 12:00)
+    if '*' not in arr_time and not (dep_minutes >= 18 * 60 and arr_minutes < 12 * 60):
+        # Early morning same-day flights (e.g., 05:45 departure) are just an early start
+        return False
+    
+    # Red-eye if arrival is during WOCL (02:00-05:59)
+    if WOCL_START_MINUTES <= arr_minutes <= WOCL_END_MINUTES:
+        return True
+    # Also catches flights that depart late (20:00+) and arrive shortly after WOCL (06:00-08:00)
+    # These still intrude WOCL while airborne
+    return dep_minutes >= 20 * 60 and WOCL_START_MINUTES <= arr_minutes <= 8 * 60
+
+def calculate_report_time(first_dep_time):
+    """Calculate report time = first departure - 60 minutes"""
+    minutes = HHMM_MINUTES.get(first_dep_time[:4])
+    if minutes is None:
         return None
+    return (minutes - 60) % 1440
 
 def calculate_release_time(last_arr_time):
     """Calculate release time = last arrival + 45 minutes"""
-    try:
-        hour = int(last_arr_time[:2])
-        minute = int(last_arr_time[2:4])
-        total_minutes = hour * 60 + minute + 45
-        if total_minutes >= 1440:
-            total_minutes -= 1440
-        return total_minutes
-    except (ValueError, IndexError):
+    minutes = HHMM_MINUTES.get(last_arr_time[:4])
+    if minutes is None:
         return None
+    return (minutes + 45) % 1440
 
-def analyze_file(file_content, base_filter, front_commute_minutes, back_commute_minutes, include_short_trips_commute=False, bid_year=2026):
+@lru_cache(maxsize=16)
+def _prepare_trips(file_content, bid_year):
     """
-    Main analysis function
-    Returns dict with all metrics
+    Parse a file once into per-trip arrays for analyze_file - nothing here
+    depends on the base or commute settings, so re-running the analysis with
+    different settings reuses the parse
+    Covers every trip with a first departure airport and a 1-7 day length
     """
-    trips = parse_trips(file_content)
-    
-    # Initialize counters (1-7 day trips supported)
-    MAX_LEN = 7
-    total_trips = 0
-    trip_counts = {i: 0 for i in range(1, MAX_LEN + 1)}
-    single_leg_counts = {i: 0 for i in range(1, MAX_LEN + 1)}
-    total_credit_by_length = {i: 0.0 for i in range(1, MAX_LEN + 1)}
-    redeye_counts = {i: 0 for i in range(1, MAX_LEN + 1)}
-    commute_front = {i: 0 for i in range(1, MAX_LEN + 1)}
-    commute_back = {i: 0 for i in range(1, MAX_LEN + 1)}
-    commute_both = {i: 0 for i in range(1, MAX_LEN + 1)}
+    import numpy as np
+    
+    trips = _parsed_trips(file_content)
+    
+    # Per trip: base id (BASE_IDS), length, occurrences, single leg on the last day, credit
+    # (0.0 if missing), red-eye flag and first departure / last arrival
+    # (minutes, -1 if the trip has no legs)
+    trip_bases = []
+    trip_lengths = []
+    trip_occurrences = []
+    trip_single_leg = []
+    trip_credit = []
+    trip_first_dep = []
+    trip_last_arr = []
+    # Every flight leg of every trip: dep/arr minutes, owning trip
+    leg_dep = []
+    leg_arr = []
+    leg_trip = []
     
     for trip in trips:
-        first_airport = get_first_departure_airport(trip)
+        index = _index_trip(trip)
+        first_airport = get_first_departure_airport(trip, index)
         if not first_airport:
             continue
         
-        # Apply base filter
-        base = BASE_MAPPING.get(first_airport, 'UNKNOWN')
-        if base_filter != "All Bases" and base != base_filter:
-            continue
-        
         # Get occurrences
-        days_of_week, start, end, occurrences = get_effective_dates(trip, bid_year)
-        length, last_day_legs, flight_legs = determine_trip_length_with_details(trip)
-        credit = get_total_credit(trip)
+        days_of_week, start, end, occurrences = get_effective_dates(trip, bid_year, index)
+        length, last_day_legs, flight_legs = determine_trip_length_with_details(trip, index)
+        credit = get_total_credit(trip, index)
         
-        # Skip trips longer than MAX_LEN (shouldn't happen, but guard anyway)
-        if length not in trip_counts:
+        # Skip trips longer than MAX_TRIP_LENGTH (shouldn't happen, but guard anyway)
+        if not 1 <= length <= MAX_TRIP_LENGTH:
             continue
-
-        total_trips += occurrences
-        trip_counts[length] += occurrences
-        
-        # Single leg on last day
-        if last_day_legs == 1:
-            single_leg_counts[length] += occurrences
-        
-        # Credit
-        if credit is not None:
-            total_credit_by_length[length] += (credit * occurrences)
         
-        # Red-eye
-        if has_redeye_flight(flight_legs):
-            redeye_counts[length] += occurrences
-        
-        # Commutability (only count trips 3+ days unless include_short_trips_commute is True)
-        if flight_legs and (include_short_trips_commute or length >= 3):
-            first_dep_time = flight_legs[0][1]
-            last_arr_time = flight_legs[-1][3]
-            
-            report_minutes = calculate_report_time(first_dep_time)
-            release_minutes = calculate_release_time(last_arr_time)
-            
-            front_ok = report_minutes is not None and report_minutes >= front_commute_minutes
-            back_ok = release_minutes is not None and release_minutes <= back_commute_minutes
-            
-            if front_ok:
-                commute_front[length] += occurrences
-            if back_ok:
-                commute_back[length] += occurrences
-            if front_ok and back_ok:
-                commute_both[length] += occurrences
-    
-    # Calculate percentages and averages
-    result = {
-        'total_trips': total_trips,
-        'trip_counts': trip_counts,
-        'avg_trip_length': sum(l * c for l, c in trip_counts.items()) / total_trips if total_trips > 0 else 0,
+        # Legs come from FLIGHT_LEG_RE, so every time is a bare 4-digit HHMM string
+        trip_id = len(trip_lengths)
+        trip_bases.append(AIRPORT_BASE_ID.get(first_airport, BASE_IDS['UNKNOWN']))
+        trip_lengths.append(length)
+        trip_occurrences.append(occurrences)
+        trip_single_leg.append(last_day_legs == 1)
+        trip_credit.append(credit if credit is not None else 0.0)
+        for dep_airport, dep_time, arr_airport, arr_time in flight_legs:
+            leg_dep.append(HHMM_MINUTES[dep_time])
+            leg_arr.append(HHMM_MINUTES[arr_time])
+            leg_trip.append(trip_id)
+        if flight_legs:
+            trip_first_dep.append(leg_dep[-len(flight_legs)])
+            trip_last_arr.append(leg_arr[-1])
+        else:
+            trip_first_dep.append(-1)
+            trip_last_arr.append(-1)
+    
+    # Red-eye: an overnight leg (18:00+ departure arriving before noon) landing
+    # in the WOCL, or departing 20:00+ and landing by 08:00. The '*' next-day
+    # marker is not part of the leg times, as in the original token scanner
+    leg_dep = np.array(leg_dep, dtype=np.int64)
+    leg_arr = np.array(leg_arr, dtype=np.int64)
+    overnight = (leg_dep >= 18 * 60) & (leg_arr < 12 * 60)
+    redeye_leg = overnight & (
+        ((leg_arr >= WOCL_START_MINUTES) & (leg_arr <= WOCL_END_MINUTES))
+        | ((leg_dep >= 20 * 60) & (leg_arr >= WOCL_START_MINUTES) & (leg_arr <= 8 * 60))
+    )
+    trip_redeye = np.bincount(np.array(leg_trip, dtype=np.int64)[redeye_leg], minlength=len(trip_lengths)) > 0
+    
+    prep = {
+        'base': np.array(trip_bases, dtype=np.int8),
+        'length': np.array(trip_lengths, dtype=np.int64),
+        'occurrences': np.array(trip_occurrences, dtype=np.int64),
+        'single_leg': np.array(trip_single_leg, dtype=bool),
+        'credit': np.array(trip_credit, dtype=np.float64),
+        'redeye': trip_redeye,
+        'first_dep': np.array(trip_first_dep, dtype=np.int64),
+        'last_arr': np.array(trip_last_arr, dtype=np.int64),
     }
+    # Shared between calls through the cache, so keep them read-only
+    for values in prep.values():
+        values.flags.writeable = False
+    return prep
+
+def analyze_file(file_content, base_filter, front_commute_minutes, back_commute_minutes, include_short_trips_commute=False, bid_year=2026):
+    """
+    Main analysis function
+    Returns dict with all metrics
+    """
+    import numpy as np
     
-    # Single leg percentages
-    result['single_leg_pct'] = {
-        length: (single_leg_counts[length] / trip_counts[length] * 100) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
+    # A file with none of the base's airports parses to the same all-zero result as an empty one
+    if base_filter != "All Bases" and not _file_has_base(file_content, base_filter):
+        file_content = ''
+    prep = _prepare_trips(file_content, bid_year)
+    
+    # 1-7 day trips supported
+    MAX_LEN = MAX_TRIP_LENGTH
+    
+    # Apply base filter
+    if base_filter != "All Bases":
+        selected = prep['base'] == BASE_IDS.get(base_filter, -1)
+    else:
+        selected = np.ones(len(prep['base']), dtype=bool)
+    trip_lengths = prep['length'][selected]
+    trip_occurrences = prep['occurrences'][selected]
+    
+    def occurrences_by_length(trip_mask):
+        """Sum occurrences of the masked trips per trip length (index = length)"""
+        return np.bincount(
+            trip_lengths[trip_mask], weights=trip_occurrences[trip_mask], minlength=MAX_LEN + 1
+        ).astype(np.int64)
+    
+    def by_length(values):
+        """Per-length array (index = length) to a {length: value} dict"""
+        return dict(zip(range(1, MAX_LEN + 1), values[1:].tolist()))
+    
+    all_trips = np.ones(len(trip_lengths), dtype=bool)
+    total_trips = int(trip_occurrences.sum())
+    trip_counts = occurrences_by_length(all_trips)
+    single_leg_counts = occurrences_by_length(prep['single_leg'][selected])
+    
+    # Credit hours per length - bincount adds in trip order, like a running sum
+    credit_totals = np.bincount(
+        trip_lengths, weights=prep['credit'][selected] * trip_occurrences, minlength=MAX_LEN + 1
+    )
     
-    # Credit averages
-    result['avg_credit_by_length'] = {
-        length: (total_credit_by_length[length] / trip_counts[length]) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
+    redeye_counts = occurrences_by_length(prep['redeye'][selected])
+    
+    # Commutability (only count trips 3+ days unless include_short_trips_commute is True)
+    # report = first departure - 60, release = last arrival + 45 (wrapped to the clock)
+    trip_first_dep = prep['first_dep'][selected]
+    trip_last_arr = prep['last_arr'][selected]
+    commute_eligible = (trip_first_dep >= 0) & (include_short_trips_commute | (trip_lengths >= 3))
+    report_minutes = (trip_first_dep - 60) % 1440
+    release_minutes = (trip_last_arr + 45) % 1440
+    front_ok = commute_eligible & (report_minutes >= front_commute_minutes)
+    back_ok = commute_eligible & (release_minutes <= back_commute_minutes)
+    commute_front = occurrences_by_length(front_ok)
+    commute_back = occurrences_by_length(back_ok)
+    commute_both = occurrences_by_length(front_ok & back_ok)
+    
+    # Per-length percentages and averages in one pass (0 where a length has no trips)
+    has_trips = trip_counts > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        single_leg_pct, redeye_pct, front_pct, back_pct, both_pct = np.where(
+            has_trips,
+            np.stack([single_leg_counts, redeye_counts, commute_front, commute_back, commute_both]) / trip_counts * 100,
+            0.0
+        )
+        avg_credit = np.where(has_trips, credit_totals / trip_counts, 0.0)
+        avg_credit_per_day = np.where(avg_credit > 0, avg_credit / np.arange(MAX_LEN + 1), 0.0)
+    
+    trip_counts_by_length = by_length(trip_counts)
+    result = {
+        'total_trips': total_trips,
+        'trip_counts': trip_counts_by_length,
+        'avg_trip_length': sum(l * c for l, c in trip_counts_by_length.items()) / total_trips if total_trips > 0 else 0,
     }
     
-    total_credit = sum(total_credit_by_length.values())
+    result['single_leg_counts'] = by_length(single_leg_counts)
+    result['single_leg_pct'] = by_length(single_leg_pct)
+    result['avg_credit_by_length'] = by_length(avg_credit)
+    
+    total_credit = sum(credit_totals[1:].tolist(), 0.0)
     result['total_credit_hours'] = total_credit
     result['avg_credit_per_trip'] = total_credit / total_trips if total_trips > 0 else 0
     
-    result['avg_credit_per_day_by_length'] = {
-        length: (result['avg_credit_by_length'][length] / length) if result['avg_credit_by_length'][length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
+    result['avg_credit_per_day_by_length'] = by_length(avg_credit_per_day)
     
-    total_days = sum(length * count for length, count in trip_counts.items())
+    total_days = sum(length * count for length, count in trip_counts_by_length.items())
     result['avg_credit_per_day'] = total_credit / total_days if total_days > 0 else 0
     
-    # Red-eye percentages
-    result['redeye_pct'] = {
-        length: (redeye_counts[length] / trip_counts[length] * 100) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
-    result['redeye_rate'] = sum(redeye_counts.values()) / total_trips * 100 if total_trips > 0 else 0
+    result['redeye_counts'] = by_length(redeye_counts)
+    result['redeye_pct'] = by_length(redeye_pct)
+    result['redeye_rate'] = int(redeye_counts.sum()) / total_trips * 100 if total_trips > 0 else 0
     
     # Commutability percentages
-    # Calculate the denominator: if short trips excluded, only count 3-5 day trips
+    # Calculate the denominator: if short trips excluded, only count 3+ day trips
     if include_short_trips_commute:
         commute_trip_total = total_trips
     else:
-        commute_trip_total = sum(trip_counts[i] for i in range(3, MAX_LEN + 1))
+        commute_trip_total = int(trip_counts[3:].sum())
     
-    result['front_commute_pct'] = {
-        length: (commute_front[length] / trip_counts[length] * 100) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
-    result['front_commute_rate'] = sum(commute_front.values()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
+    result['front_commute_counts'] = by_length(commute_front)
+    result['front_commute_pct'] = by_length(front_pct)
+    result['front_commute_rate'] = int(commute_front.sum()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
     
-    result['back_commute_pct'] = {
-        length: (commute_back[length] / trip_counts[length] * 100) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
-    result['back_commute_rate'] = sum(commute_back.values()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
+    result['back_commute_counts'] = by_length(commute_back)
+    result['back_commute_pct'] = by_length(back_pct)
+    result['back_commute_rate'] = int(commute_back.sum()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
     
-    result['both_commute_pct'] = {
-        length: (commute_both[length] / trip_counts[length] * 100) if trip_counts[length] > 0 else 0
-        for length in range(1, MAX_LEN + 1)
-    }
-    result['both_commute_rate'] = sum(commute_both.values()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
+    result['both_commute_counts'] = by_length(commute_both)
+    result['both_commute_pct'] = by_length(both_pct)
+    result['both_commute_rate'] = int(commute_both.sum()) / commute_trip_total * 100 if commute_trip_total > 0 else 0
     
     return result
 
+def analyze_files(uploaded_files, base_filter, front_commute_minutes, back_commute_minutes, include_short_trips_commute=False):
+    """
+    Run analyze_file over each uploaded file (fname -> dict with 'content' and 'year')
+    Runs in-process so re-analysis with new settings reuses the per-file parse caches
+    Returns dict of fname -> analyze_file result, in upload order
+    """
+    return {
+        fname: analyze_file(fdata['content'], base_filter, front_commute_minutes, back_commute_minutes,
+                            include_short_trips_commute, fdata['year'])
+        for fname, fdata in uploaded_files.items()
+    }
+
 def get_detailed_trips(file_content, base_filter, bid_month, bid_year=2026):
     """
     Extract detailed information for all trips in a file
     Handles split trips (when EFFECTIVE contains previous month)
     Returns list of unique trip detail dicts with occurrence counts
     """
-    trips = parse_trips(file_content)
+    filter_by_base = base_filter != "All Bases"
+    if filter_by_base and not _file_has_base(file_content, base_filter):
+        return []
+    
+    trips = _parsed_trips(file_content)
     detailed_trips = []
+    base_of = BASE_MAPPING.get
     
     for trip in trips:
         first_airport = get_first_departure_airport(trip)
@@ -1066,20 +1307,21 @@ def get_detailed_trips(file_content, base_filter, bid_month, bid_year=2026):
             continue
         
         # Apply base filter
-        base = BASE_MAPPING.get(first_airport, 'UNKNOWN')
-        if base_filter != "All Bases" and base != base_filter:
+        if filter_by_base and base_of(first_airport, 'UNKNOWN') != base_filter:
             continue
         
+        index = _index_trip(trip)
+        
         # Check if this is a split trip
-        if is_split_trip(trip, bid_month):
+        if is_split_trip(trip, bid_month, index):
             # Split into two sections
-            section1, section2, split_idx = split_trip_into_sections(trip)
+            section1, section2, split_idx = split_trip_into_sections(trip, index)
             
             if section1 and section2:
                 # Get base from section 1 (the original/complete trip)
                 # Section 2 might start with DH or incomplete data
                 first_airport_s1 = get_first_departure_airport(section1)
-                base_s1 = BASE_MAPPING.get(first_airport_s1, 'UNKNOWN') if first_airport_s1 else 'UNKNOWN'
+                base_s1 = base_of(first_airport_s1, 'UNKNOWN') if first_airport_s1 else 'UNKNOWN'
                 
                 # SECTION 1: Uses file's TOTAL CREDIT/PAY, occurs on previous month date only (1 occurrence)
                 trip_info1 = extract_detailed_trip_info(section1)
@@ -1108,7 +1350,7 @@ def get_detailed_trips(file_content, base_filter, bid_month, bid_year=2026):
                 trip_info2['carve'] = None
                 
                 # Get occurrences for section 2 (subtract 1 for the first occurrence)
-                days_of_week, start, end, total_occurrences = get_effective_dates(trip)
+                days_of_week, start, end, total_occurrences = get_effective_dates(trip, index=index)
                 section2_occurrences = max(total_occurrences - 1, 0)
                 trip_info2['occurrences'] = section2_occurrences
                 
@@ -1117,10 +1359,10 @@ def get_detailed_trips(file_content, base_filter, bid_month, bid_year=2026):
         else:
             # Normal trip (not split)
             # Get occurrences for this trip
-            days_of_week, start, end, occurrences = get_effective_dates(trip, bid_year)
+            days_of_week, start, end, occurrences = get_effective_dates(trip, bid_year, index)
             
             # Extract detailed info
-            trip_info = extract_detailed_trip_info(trip)
+            trip_info = extract_detailed_trip_info(trip, index)
             trip_info['occurrences'] = occurrences
             
             # Add as single entry with occurrence count
@@ -1128,26 +1370,145 @@ def get_detailed_trips(file_content, base_filter, bid_month, bid_year=2026):
     
     return detailed_trips
 
+def _render_trip_length_chart(file_labels, trip_pcts):
+    """
+    Render the trip length distribution bar chart to a palette PNG buffer
+    trip_pcts is a (files, lengths) array of percentages
+    Uses a bare Figure and per-artist text settings, leaving pyplot and rcParams alone
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib import font_manager
+    import numpy as np
+    from PIL import Image as PILImage
+    
+    # Pin the chart font so text layout skips the font fallback search
+    font_manager.findfont(TREND_CHART_TEXT['family'])
+    fig = Figure(figsize=(10, 4), dpi=TREND_CHART_DPI)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    x = range(len(file_labels))
+    width = 0.11  # narrower to fit 7 bars
+
+    for i, length in enumerate(range(1, 8)):
+        ax.bar([xi + width*i for xi in x], trip_pcts[:, length - 1], width, label=f'{length}-day')
+
+    ax.set_xlabel('Month', **TREND_CHART_TEXT)
+    ax.set_ylabel('Percentage (%)', **TREND_CHART_TEXT)
+    ax.set_title('Trip Length Distribution Over Time', **TREND_CHART_TEXT)
+    ax.set_xticks([xi + width*3 for xi in x], labels=file_labels, rotation=45, ha='right',
+                  **TREND_CHART_TEXT)
+    # Y ticks are created at draw time, copying their label settings from the first tick
+    for label in ax.get_yticklabels():
+        label.set(**TREND_CHART_TEXT)
+    ax.legend(prop={'family': TREND_CHART_TEXT['family']})
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    
+    # Charts only use a handful of flat colours, so an 8-bit palette PNG
+    # straight from the Agg buffer is much smaller and faster to encode
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())
+    img = PILImage.fromarray(rgba, 'RGBA').convert('RGB').quantize(
+        colors=TREND_CHART_PNG_COLORS, method=PILImage.Quantize.FASTOCTREE
+    )
+    img_buffer = BytesIO()
+    img.save(img_buffer, format='PNG', optimize=False, compress_level=3)
+    img_buffer.seek(0)
+    return img_buffer
+
+def _create_trend_line_drawing(title, ylabel, file_labels, series, width, height):
+    """
+    Build a vector line chart for the PDF report
+    series is a list of (label, values, marker_name) with one value per file
+    """
+    drawing = Drawing(width, height)
+    drawing.hAlign = 'CENTER'
+    
+    # Leave room for the title, rotated file labels, y-axis label and legend
+    plot_left = 55
+    plot_bottom = 62
+    legend_w = 80
+    plot_w = width - plot_left - legend_w - 15
+    plot_h = height - plot_bottom - 22
+    
+    drawing.add(String(plot_left + plot_w / 2, height - 12, title,
+                       fontName='Helvetica', fontSize=9, textAnchor='middle'))
+    
+    drawing.add(String(plot_left + plot_w / 2, 4, 'Month',
+                       fontName='Helvetica', fontSize=7, textAnchor='middle'))
+    
+    ylabel_group = Group(String(0, 0, ylabel, fontName='Helvetica', fontSize=7, textAnchor='middle'))
+    ylabel_group.translate(14, plot_bottom + plot_h / 2)
+    ylabel_group.rotate(90)
+    drawing.add(ylabel_group)
+    
+    chart = HorizontalLineChart()
+    chart.x = plot_left
+    chart.y = plot_bottom
+    chart.width = plot_w
+    chart.height = plot_h
+    chart.data = [list(values) for _, values, _ in series]
+    chart.joinedLines = 1
+    
+    chart.categoryAxis.categoryNames = list(file_labels)
+    chart.categoryAxis.labels.angle = 45
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.categoryAxis.labels.dx = 4
+    chart.categoryAxis.labels.dy = -2
+    chart.categoryAxis.labels.fontName = 'Helvetica'
+    chart.categoryAxis.labels.fontSize = 6
+    chart.categoryAxis.visibleGrid = 1
+    chart.categoryAxis.gridStrokeColor = TREND_GRID_COLOR
+    chart.categoryAxis.gridStrokeWidth = 0.4
+    
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontName = 'Helvetica'
+    chart.valueAxis.labels.fontSize = 6
+    chart.valueAxis.visibleGrid = 1
+    chart.valueAxis.gridStrokeColor = TREND_GRID_COLOR
+    chart.valueAxis.gridStrokeWidth = 0.4
+    
+    color_name_pairs = []
+    for i, (label, _, marker_name) in enumerate(series):
+        series_color = TREND_SERIES_COLORS[i % len(TREND_SERIES_COLORS)]
+        chart.lines[i].strokeColor = series_color
+        chart.lines[i].strokeWidth = 1.5
+        chart.lines[i].symbol = makeMarker(marker_name, size=4, fillColor=series_color, strokeColor=series_color)
+        color_name_pairs.append((series_color, label))
+    drawing.add(chart)
+    
+    legend = Legend()
+    legend.x = plot_left + plot_w + 15
+    legend.y = plot_bottom + plot_h
+    legend.boxAnchor = 'nw'
+    legend.colorNamePairs = color_name_pairs
+    legend.fontName = 'Helvetica'
+    legend.fontSize = 6
+    legend.dx = 8
+    legend.dy = 6
+    legend.deltay = 9
+    legend.columnMaximum = len(series)
+    drawing.add(legend)
+    
+    return drawing
+
 def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_time, back_time):
     """Generate PDF report with tables on page 1 and trend graphs on page 2+"""
-    buffer = BytesIO()
+    # Small reports stay in memory; chart-heavy ones spill to disk while building
+    buffer = SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
     doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), 
                            topMargin=0.5*inch, bottomMargin=0.5*inch,
                            leftMargin=0.5*inch, rightMargin=0.5*inch)
     story = []
     styles = getSampleStyleSheet()
     
-    # Sort files by date
-    month_order = {
-        'January': 1, 'February': 2, 'March': 3, 'April': 4,
-        'May': 5, 'June': 6, 'July': 7, 'August': 8,
-        'September': 9, 'October': 10, 'November': 11, 'December': 12
+    # Sort files by date (year * 100 + month, worked out once per file)
+    file_dates = {
+        f: uploaded_files[f]['year'] * 100 + MONTH_NAME_NUM[uploaded_files[f]['month']]
+        for f in analysis_results
     }
-    
-    sorted_files = sorted(
-        analysis_results.keys(),
-        key=lambda f: (uploaded_files[f]['year'], month_order[uploaded_files[f]['month']])
-    )
+    sorted_files = sorted(file_dates, key=file_dates.get)
     
     num_files = len(sorted_files)
     
@@ -1180,29 +1541,33 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         file_col_width = (available_width - 1.0*inch) / 6
         col_widths = [1.0*inch] + [file_col_width] * 6
     
+    # Calculate appropriate font size based on number of files
+    if num_files <= 6:
+        font_size = 7
+    elif num_files <= 9:
+        font_size = 6
+    else:
+        font_size = 5
+    
+    # Every table shares one style and one heading style
+    table_title_style = ParagraphStyle('Heading', fontSize=10, spaceAfter=0.05*inch)
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 3),
+        ('TOPPADDING', (0, 0), (-1, 0), 3),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+    
     # Helper function to create table
     def create_table(data, title):
-        # Calculate appropriate font size based on number of files
-        if num_files <= 6:
-            font_size = 7
-        elif num_files <= 9:
-            font_size = 6
-        else:
-            font_size = 5
-        
-        title_para = Paragraph(f"<b>{title}</b>", ParagraphStyle('Heading', fontSize=10, spaceAfter=0.05*inch))
+        title_para = Paragraph(f"<b>{title}</b>", table_title_style)
         t = Table(data, colWidths=col_widths)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), font_size),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 3),
-            ('TOPPADDING', (0, 0), (-1, 0), 3),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        t.setStyle(table_style)
         
         # Use KeepTogether to prevent table from splitting across pages
         story.append(KeepTogether([title_para, t, Spacer(1, 0.05*inch)]))
@@ -1228,13 +1593,11 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         display_name = uploaded_files[fname]['display_name']
         row = [display_name]
         for length in range(1, 8):
-            total = result['trip_counts'].get(length, 0)
-            single_count = int(total * result['single_leg_pct'].get(length, 0) / 100)
+            single_count = result['single_leg_counts'].get(length, 0)
             pct = result['single_leg_pct'].get(length, 0)
             row.append(f"{single_count}\n({pct:.1f}%)")
-        total_single = sum(result['trip_counts'].get(i, 0) * result['single_leg_pct'].get(i, 0) / 100 for i in range(1, 8))
-        overall_pct = (total_single / result['total_trips'] * 100) if result['total_trips'] > 0 else 0
-        overall_count = int(total_single)
+        overall_count = sum(result['single_leg_counts'].values())
+        overall_pct = (overall_count / result['total_trips'] * 100) if result['total_trips'] > 0 else 0
         row.append(f"{overall_count}\n({overall_pct:.1f}%)")
         data.append(row)
     create_table(data, "2. Single Leg on Last Day")
@@ -1270,12 +1633,10 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         display_name = uploaded_files[fname]['display_name']
         row = [display_name]
         for length in range(1, 8):
-            total = result['trip_counts'].get(length, 0)
-            commute_count = int(total * result['front_commute_pct'].get(length, 0) / 100)
+            commute_count = result['front_commute_counts'].get(length, 0)
             pct = result['front_commute_pct'].get(length, 0)
             row.append(f"{commute_count}\n({pct:.1f}%)")
-        total_commute = sum(result['trip_counts'].get(i, 0) * result['front_commute_pct'].get(i, 0) / 100 for i in range(1, 8))
-        overall_count = int(total_commute)
+        overall_count = sum(result['front_commute_counts'].values())
         row.append(f"{overall_count}\n({result['front_commute_rate']:.1f}%)")
         data.append(row)
     create_table(data, "5a. Front-End Commutability")
@@ -1287,12 +1648,10 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         display_name = uploaded_files[fname]['display_name']
         row = [display_name]
         for length in range(1, 8):
-            total = result['trip_counts'].get(length, 0)
-            commute_count = int(total * result['back_commute_pct'].get(length, 0) / 100)
+            commute_count = result['back_commute_counts'].get(length, 0)
             pct = result['back_commute_pct'].get(length, 0)
             row.append(f"{commute_count}\n({pct:.1f}%)")
-        total_commute = sum(result['trip_counts'].get(i, 0) * result['back_commute_pct'].get(i, 0) / 100 for i in range(1, 8))
-        overall_count = int(total_commute)
+        overall_count = sum(result['back_commute_counts'].values())
         row.append(f"{overall_count}\n({result['back_commute_rate']:.1f}%)")
         data.append(row)
     create_table(data, "5b. Back-End Commutability")
@@ -1304,12 +1663,10 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         display_name = uploaded_files[fname]['display_name']
         row = [display_name]
         for length in range(1, 8):
-            total = result['trip_counts'].get(length, 0)
-            commute_count = int(total * result['both_commute_pct'].get(length, 0) / 100)
+            commute_count = result['both_commute_counts'].get(length, 0)
             pct = result['both_commute_pct'].get(length, 0)
             row.append(f"{commute_count}\n({pct:.1f}%)")
-        total_commute = sum(result['trip_counts'].get(i, 0) * result['both_commute_pct'].get(i, 0) / 100 for i in range(1, 8))
-        overall_count = int(total_commute)
+        overall_count = sum(result['both_commute_counts'].values())
         row.append(f"{overall_count}\n({result['both_commute_rate']:.1f}%)")
         data.append(row)
     create_table(data, "5c. Both Ends Commutability")
@@ -1321,12 +1678,10 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         display_name = uploaded_files[fname]['display_name']
         row = [display_name]
         for length in range(1, 8):
-            total = result['trip_counts'].get(length, 0)
-            redeye_count = int(total * result['redeye_pct'].get(length, 0) / 100)
+            redeye_count = result['redeye_counts'].get(length, 0)
             pct = result['redeye_pct'].get(length, 0)
             row.append(f"{redeye_count}\n({pct:.1f}%)")
-        total_redeye = sum(result['trip_counts'].get(i, 0) * result['redeye_pct'].get(i, 0) / 100 for i in range(1, 8))
-        overall_count = int(total_redeye)
+        overall_count = sum(result['redeye_counts'].values())
         row.append(f"{overall_count}\n({result['redeye_rate']:.1f}%)")
         data.append(row)
     create_table(data, "6. Trips Containing Red-Eye Flight")
@@ -1339,166 +1694,94 @@ def generate_pdf_report(analysis_results, uploaded_files, base_filter, front_tim
         story.append(Paragraph("<b>Trend Analysis</b>", title_style))
         story.append(Spacer(1, 0.2*inch))
         
-        # Import matplotlib for graphs
-        import matplotlib.pyplot as plt
-        import matplotlib
-        matplotlib.use('Agg')
-        from io import BytesIO as ImgBuffer
+        import numpy as np
         from reportlab.platypus import Image
         
         # Prepare data for graphs
         file_labels = [uploaded_files[f]['display_name'] for f in sorted_files]
         
-        # Graph 1: Trip Length Distribution (by percentage)
-        fig, ax = plt.subplots(figsize=(10, 4))
-        x = range(len(file_labels))
-        width = 0.11  # narrower to fit 7 bars
-
-        for i, length in enumerate(range(1, 8)):
-            percentages = []
-            for fname in sorted_files:
-                result = analysis_results[fname]
-                pct = (result['trip_counts'].get(length, 0) / result['total_trips'] * 100) if result['total_trips'] > 0 else 0
-                percentages.append(pct)
-            ax.bar([xi + width*i for xi in x], percentages, width, label=f'{length}-day')
-
-        ax.set_xlabel('Month')
-        ax.set_ylabel('Percentage (%)')
-        ax.set_title('Trip Length Distribution Over Time')
-        ax.set_xticks([xi + width*3 for xi in x])
-        ax.set_xticklabels(file_labels, rotation=45, ha='right')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
+        # Per-length metrics gathered once into a (files, lengths, metrics) array
+        # so each chart slices a column instead of walking the result dicts
+        TRIP_PCT, CREDIT, CREDIT_PER_DAY, SINGLE_LEG = range(4)
+        length_metrics = np.array([
+            [
+                [
+                    (result['trip_counts'].get(length, 0) / result['total_trips'] * 100) if result['total_trips'] > 0 else 0,
+                    result['avg_credit_by_length'][length],
+                    result['avg_credit_per_day_by_length'][length],
+                    result['single_leg_pct'][length],
+                ]
+                for length in range(1, 8)
+            ]
+            for result in (analysis_results[f] for f in sorted_files)
+        ], dtype=float)
         
-        img_buffer = ImgBuffer()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        story.append(Image(img_buffer, width=7*inch, height=2.8*inch))
-        plt.close()
+        # Graph 1: Trip Length Distribution (by percentage)
+        trip_length_png = _render_trip_length_chart(file_labels, length_metrics[:, :, TRIP_PCT])
+        story.append(Image(trip_length_png, width=7*inch, height=2.8*inch))
         story.append(Spacer(1, 0.2*inch))
         
-        # Graph 2: Average Credit per Trip
-        fig, ax = plt.subplots(figsize=(10, 4))
-        for length in range(1, 8):
-            credits = [analysis_results[f]['avg_credit_by_length'][length] for f in sorted_files]
-            ax.plot(file_labels, credits, marker='o', label=f'{length}-day', linewidth=2)
+        # Line charts are drawn as ReportLab vector graphics, no rasterizing
+        length_series = lambda metric: [
+            (f'{length}-day', length_metrics[:, length - 1, metric], 'FilledCircle')
+            for length in range(1, 8)
+        ]
         
-        ax.set_xlabel('Month')
-        ax.set_ylabel('Average Credit (hours)')
-        ax.set_title('Average Credit per Trip Over Time')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
+        # Graph 2: Average Credit per Trip
+        story.append(_create_trend_line_drawing(
+            'Average Credit per Trip Over Time', 'Average Credit (hours)',
+            file_labels, length_series(CREDIT), 7*inch, 2.8*inch
+        ))
         
-        img_buffer = ImgBuffer()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        story.append(Image(img_buffer, width=7*inch, height=2.8*inch))
-        plt.close()
-        story.append(Spacer(1, 0.2*inch))
+        # Page 3
+        story.append(PageBreak())
         
         # Graph 3: Commutability Trends
-        fig, ax = plt.subplots(figsize=(10, 4))
-        
         front_rates = [analysis_results[f]['front_commute_rate'] for f in sorted_files]
         back_rates = [analysis_results[f]['back_commute_rate'] for f in sorted_files]
         both_rates = [analysis_results[f]['both_commute_rate'] for f in sorted_files]
-        
-        ax.plot(file_labels, front_rates, marker='o', label='Front-End', linewidth=2)
-        ax.plot(file_labels, back_rates, marker='s', label='Back-End', linewidth=2)
-        ax.plot(file_labels, both_rates, marker='^', label='Both Ends', linewidth=2)
-        
-        ax.set_xlabel('Month')
-        ax.set_ylabel('Commutability (%)')
-        ax.set_title('Commutability Trends Over Time')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        img_buffer = ImgBuffer()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        story.append(Image(img_buffer, width=7*inch, height=2.8*inch))
-        plt.close()
-        
-        # Page 3 if needed
-        story.append(PageBreak())
+        story.append(_create_trend_line_drawing(
+            'Commutability Trends Over Time', 'Commutability (%)', file_labels,
+            [('Front-End', front_rates, 'FilledCircle'),
+             ('Back-End', back_rates, 'FilledSquare'),
+             ('Both Ends', both_rates, 'FilledTriangle')],
+            7*inch, 2.3*inch
+        ))
+        story.append(Spacer(1, 0.1*inch))
         
         # Graph 4: Average Credit per Day
-        fig, ax = plt.subplots(figsize=(10, 4))
-        for length in range(1, 8):
-            credits = [analysis_results[f]['avg_credit_per_day_by_length'][length] for f in sorted_files]
-            ax.plot(file_labels, credits, marker='o', label=f'{length}-day', linewidth=2)
-        
-        ax.set_xlabel('Month')
-        ax.set_ylabel('Average Credit per Day (hrs/day)')
-        ax.set_title('Average Credit per Day Over Time')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        img_buffer = ImgBuffer()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        story.append(Image(img_buffer, width=7*inch, height=2.8*inch))
-        plt.close()
-        story.append(Spacer(1, 0.2*inch))
+        story.append(_create_trend_line_drawing(
+            'Average Credit per Day Over Time', 'Average Credit per Day (hrs/day)',
+            file_labels, length_series(CREDIT_PER_DAY), 7*inch, 2.3*inch
+        ))
+        story.append(Spacer(1, 0.1*inch))
         
         # Graph 5: Single Leg Last Day Trends
-        fig, ax = plt.subplots(figsize=(10, 4))
-        for length in range(1, 8):
-            percentages = [analysis_results[f]['single_leg_pct'][length] for f in sorted_files]
-            ax.plot(file_labels, percentages, marker='o', label=f'{length}-day', linewidth=2)
-        
-        ax.set_xlabel('Month')
-        ax.set_ylabel('Single Leg Last Day (%)')
-        ax.set_title('Single Leg on Last Day Trends Over Time')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        img_buffer = ImgBuffer()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        story.append(Image(img_buffer, width=7*inch, height=2.8*inch))
-        plt.close()
+        story.append(_create_trend_line_drawing(
+            'Single Leg on Last Day Trends Over Time', 'Single Leg Last Day (%)',
+            file_labels, length_series(SINGLE_LEG), 7*inch, 2.3*inch
+        ))
     
     doc.build(story)
-    pdf_bytes = buffer.getvalue()
+    buffer.seek(0)
+    pdf_bytes = buffer.read()
     buffer.close()
     return pdf_bytes
 
 
-def get_last_leg_is_dh(trip_lines):
+def get_last_leg_is_dh(trip_lines, index=None):
     """
     Return True if the last flight leg of the trip is a deadhead (DH).
-    Scans every line with an airport-time-airport-time pattern and checks
+    Finds the last line with an airport-time-airport-time pattern and checks
     whether 'DH' appears among the tokens on that same line.
     """
-    last_leg_dh = False
-    for line in trip_lines:
-        if len(line) < 10:
-            continue
-        parts = line.split()
-        if len(parts) < 4:
-            continue
-        for i in range(len(parts) - 3):
-            p1 = parts[i]
-            p2 = parts[i + 1].rstrip('*')
-            p3 = parts[i + 2]
-            p4 = parts[i + 3].rstrip('*')
-            if (len(p1) == 3 and p1.isalpha() and p1.isupper() and
-                    len(p2) == 4 and p2.isdigit() and
-                    len(p3) == 3 and p3.isalpha() and p3.isupper() and
-                    len(p4) == 4 and p4.isdigit()):
-                last_leg_dh = 'DH' in parts
-                break
-    return last_leg_dh
+    if index is None:
+        index = _index_trip(trip_lines)
+    if not index['legs']:
+        return False
+    last_leg_line = trip_lines[next(reversed(index['legs']))]
+    # Substring test first - most legs are not deadheads, so the split is rare
+    return 'DH' in last_leg_line and 'DH' in last_leg_line.split()
 
 
 def generate_selected_trips_pdf(selected_trips, display_name="", settings_text=""):
@@ -1508,7 +1791,8 @@ def generate_selected_trips_pdf(selected_trips, display_name="", settings_text="
     Trip #, Base, Length, Days, Report, Release, Legs, Longest, Shortest,
     Credit, Pay, SIT, EDP, HOL, CARVE, Occurs
     """
-    buffer = BytesIO()
+    # Long selections spill to disk while building, like generate_pdf_report
+    buffer = SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
     doc = SimpleDocTemplate(
         buffer,
         pagesize=landscape(letter),
@@ -1517,23 +1801,15 @@ def generate_selected_trips_pdf(selected_trips, display_name="", settings_text="
         leftMargin=0.4 * inch,
         rightMargin=0.4 * inch,
     )
-    styles = getSampleStyleSheet()
     story = []
 
     # ── Title ────────────────────────────────────────────────────────────────
-    title_style = ParagraphStyle(
-        'SelTitle', parent=styles['Title'], fontSize=14, spaceAfter=2
-    )
-    sub_style = ParagraphStyle(
-        'SelSub', parent=styles['Normal'], fontSize=8,
-        textColor=colors.HexColor('#555555'), spaceAfter=8
-    )
     story.append(Paragraph(
         f"Selected Trips – {display_name}" if display_name else "Selected Trips",
-        title_style
+        SELECTED_TRIPS_TITLE_STYLE
     ))
     if settings_text:
-        story.append(Paragraph(settings_text, sub_style))
+        story.append(Paragraph(settings_text, SELECTED_TRIPS_SUB_STYLE))
     story.append(Spacer(1, 0.05 * inch))
 
     # ── Column definitions ────────────────────────────────────────────────────
@@ -1559,69 +1835,50 @@ def generate_selected_trips_pdf(selected_trips, display_name="", settings_text="
     col_widths = [w * inch for _, w in col_defs]
     headers = [name for name, _ in col_defs]
 
-    def fmt(val, decimals=2):
+    # Bound once - the format spec isn't re-parsed per cell, and numbers
+    # (the usual case) skip the float() conversion and try block
+    fmt2 = "{:.2f}".format
+
+    def fmt(val):
         if val is None:
             return ""
+        if isinstance(val, (int, float)):
+            return fmt2(val)
         try:
-            f = float(val)
-            return f"{f:.{decimals}f}"
+            return fmt2(float(val))
         except (TypeError, ValueError):
             return str(val)
 
     # ── Rows ──────────────────────────────────────────────────────────────────
+    # One comprehension over each trip's bound .get
+    join_days = '/'.join
     rows = [headers]
-    for t in selected_trips:
-        days_str = '/'.join(t.get('days_of_week', [])) if t.get('days_of_week') else ''
-        rows.append([
-            str(t.get('trip_number') or 'N/A'),
-            str(t.get('base') or ''),
-            f"{t.get('length', '')}-day",
-            days_str,
-            str(t.get('report_time') or ''),
-            str(t.get('release_time') or ''),
-            str(t.get('total_legs') or ''),
-            str(t.get('longest_leg') or ''),
-            str(t.get('shortest_leg') or ''),
-            fmt(t.get('total_credit')),
-            fmt(t.get('total_pay')),
-            fmt(t.get('sit')),
-            fmt(t.get('edp')),
-            fmt(t.get('hol')),
-            fmt(t.get('carve')),
-            str(t.get('occurrences', 1)),
-        ])
+    rows.extend([
+        str(get('trip_number') or 'N/A'),
+        str(get('base') or ''),
+        f"{get('length', '')}-day",
+        join_days(get('days_of_week') or ()),
+        str(get('report_time') or ''),
+        str(get('release_time') or ''),
+        str(get('total_legs') or ''),
+        str(get('longest_leg') or ''),
+        str(get('shortest_leg') or ''),
+        fmt(get('total_credit')),
+        fmt(get('total_pay')),
+        fmt(get('sit')),
+        fmt(get('edp')),
+        fmt(get('hol')),
+        fmt(get('carve')),
+        str(get('occurrences', 1)),
+    ] for get in (t.get for t in selected_trips))
 
     # ── Table style ───────────────────────────────────────────────────────────
-    header_bg   = colors.HexColor('#1a3a6b')
-    alt_row_bg  = colors.HexColor('#eef2f8')
-    border_col  = colors.HexColor('#aaaaaa')
-
-    tbl_style = TableStyle([
-        # Header
-        ('BACKGROUND',    (0, 0), (-1, 0),  header_bg),
-        ('TEXTCOLOR',     (0, 0), (-1, 0),  colors.white),
-        ('FONTNAME',      (0, 0), (-1, 0),  'Helvetica-Bold'),
-        ('FONTSIZE',      (0, 0), (-1, 0),  7),
-        ('BOTTOMPADDING', (0, 0), (-1, 0),  4),
-        ('TOPPADDING',    (0, 0), (-1, 0),  4),
-        # Data rows
-        ('FONTNAME',      (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE',      (0, 1), (-1, -1), 7),
-        ('TOPPADDING',    (0, 1), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 3),
-        # Alignment
-        ('ALIGN',         (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN',        (0, 0), (-1, -1), 'MIDDLE'),
-        # Grid
-        ('GRID',          (0, 0), (-1, -1), 0.4, border_col),
-        ('LINEBELOW',     (0, 0), (-1, 0),  1.0, colors.white),
+    # Fixed commands plus alternating row colours on every even data row
+    tbl_style = TableStyle(list(SELECTED_TRIPS_TABLE_CMDS) + [
+        ('BACKGROUND', (0, row_idx), (-1, row_idx), SELECTED_TRIPS_ALT_ROW_BG)
+        for row_idx in range(2, len(rows), 2)
     ])
 
-    # Alternating row colours
-    for row_idx in range(1, len(rows)):
-        if row_idx % 2 == 0:
-            tbl_style.add('BACKGROUND', (0, row_idx), (-1, row_idx), alt_row_bg)
-
     tbl = Table(rows, colWidths=col_widths, repeatRows=1)
     tbl.setStyle(tbl_style)
     story.append(tbl)
@@ -1631,24 +1888,23 @@ def generate_selected_trips_pdf(selected_trips, display_name="", settings_text="
     total_occ = sum(t.get('occurrences', 1) for t in selected_trips)
     story.append(Paragraph(
         f"{len(selected_trips)} unique trip pattern(s) · {total_occ} total occurrence(s)",
-        ParagraphStyle('Footer', parent=styles['Normal'], fontSize=7,
-                       textColor=colors.grey)
+        SELECTED_TRIPS_FOOTER_STYLE
     ))
 
     doc.build(story)
-    pdf_bytes = buffer.getvalue()
+    buffer.seek(0)
+    pdf_bytes = buffer.read()
     buffer.close()
     return pdf_bytes
 
 
 def generate_selected_trips_txt(selected_trips):
     """Return plain text of selected trip raw blocks for download."""
-    parts = []
-    for trip in selected_trips:
-        trip_num = trip.get('trip_number') or 'N/A'
-        raw = trip.get('raw_text', '')
-        parts.append(f"{'='*60}\nTRIP #{trip_num}\n{'='*60}\n{raw}\n")
-    return '\n'.join(parts)
+    block = SELECTED_TRIPS_TXT_BLOCK.format
+    return '\n'.join(
+        block(trip.get('trip_number') or 'N/A', trip.get('raw_text', ''))
+        for trip in selected_trips
+    )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1672,15 +1928,22 @@ def get_all_flight_legs_with_block(trip_lines):
     """Extract all flight legs with their block times from trip lines."""
     legs = []
     for line in trip_lines:
+        # A leg only counts with a block time, and block times contain a '.'
+        if '.' not in line:
+            continue
         parts = line.split()
         i = 0
-        while i < len(parts) - 3:
+        n_starts = len(parts) - 3
+        while i < n_starts:
             p1 = parts[i]
+            # Most tokens aren't airport codes, so reject on p1 before looking further
+            if not (len(p1) == 3 and p1.isalpha() and p1.isupper()):
+                i += 1
+                continue
             p2 = parts[i + 1].rstrip('*')
             p3 = parts[i + 2]
             p4 = parts[i + 3].rstrip('*')
-            if (len(p1) == 3 and p1.isalpha() and p1.isupper() and
-                    len(p2) == 4 and p2.isdigit() and
+            if (len(p2) == 4 and p2.isdigit() and
                     len(p3) == 3 and p3.isalpha() and p3.isupper() and
                     len(p4) == 4 and p4.isdigit()):
                 block_val = None
@@ -1704,6 +1967,27 @@ def get_all_flight_legs_with_block(trip_lines):
     return legs
 
 
+@lru_cache(maxsize=16)
+def _prepare_route_legs(file_content, bid_year):
+    """
+    Parse a file once into (trip base, occurrences, legs) per operating trip
+    for get_base_top20_legs - the base report asks for every base in turn,
+    so the parse is shared across them
+    """
+    trip_legs = []
+    for trip in _parsed_trips(file_content):
+        index = _index_trip(trip)
+        fa = get_first_departure_airport(trip, index)
+        if not fa:
+            continue
+        _, _, _, occurrences = get_effective_dates(trip, bid_year, index)
+        if occurrences <= 0:
+            continue
+        trip_legs.append((
+            BASE_MAPPING.get(fa, 'UNKNOWN'), occurrences, tuple(get_all_flight_legs_with_block(trip))
+        ))
+    return tuple(trip_legs)
+
 def get_base_top20_legs(file_content, base, bid_year=2026):
     """
     Get top-20 legs sorted by frequency.
@@ -1714,40 +1998,33 @@ def get_base_top20_legs(file_content, base, bid_year=2026):
     if base == "All Bases":
         filter_airports = None
     else:
-        filter_airports = {k for k, v in BASE_MAPPING.items() if v == base}
+        filter_airports = BASE_AIRPORTS.get(base, frozenset())
 
-    trips = parse_trips(file_content)
     route_data = {}
 
-    for trip in trips:
-        fa = get_first_departure_airport(trip)
-        if not fa:
-            continue
-        trip_base = BASE_MAPPING.get(fa, 'UNKNOWN')
-        _, _, _, occurrences = get_effective_dates(trip, bid_year)
-        if occurrences <= 0:
-            continue
-        legs = get_all_flight_legs_with_block(trip)
+    for trip_base, occurrences, legs in _prepare_route_legs(file_content, bid_year):
         for dep, arr, block_str, block_minutes in legs:
             if filter_airports is not None and dep not in filter_airports:
                 continue
             route = f"{dep}-{arr}"
-            if route not in route_data:
-                route_data[route] = {
+            data = route_data.get(route)
+            if data is None:
+                data = route_data[route] = {
                     'block_minutes': block_minutes,
                     'block_str': block_str,
                     'total': 0,
-                    'by_base': {},
+                    'by_base': defaultdict(int),
                 }
-            route_data[route]['total'] += occurrences
-            bd = route_data[route]['by_base']
-            bd[trip_base] = bd.get(trip_base, 0) + occurrences
+            data['total'] += occurrences
+            data['by_base'][trip_base] += occurrences
 
     top20 = sorted(route_data.items(), key=lambda x: x[1]['total'], reverse=True)[:25]
 
     legs_result = []
     total_top20 = 0
     base_top20 = 0
+    # Orders (base, count) pairs by count; ties keep by_base insertion order
+    by_count = itemgetter(1)
 
     for route, data in top20:
         total = data['total']
@@ -1755,7 +2032,7 @@ def get_base_top20_legs(file_content, base, bid_year=2026):
 
         if base == "All Bases":
             if data['by_base']:
-                top_b, top_cnt = max(data['by_base'].items(), key=lambda x: x[1])
+                top_b, top_cnt = max(data['by_base'].items(), key=by_count)
                 bp = int(round(top_cnt / total * 100))
                 crew_dist = top_b
                 base_top20 += top_cnt
@@ -1765,7 +2042,7 @@ def get_base_top20_legs(file_content, base, bid_year=2026):
             base_cnt = data['by_base'].get(base, 0)
             base_top20 += base_cnt
             bp = int(round(base_cnt / total * 100)) if total > 0 else 0
-            top5 = sorted(data['by_base'].items(), key=lambda x: x[1], reverse=True)[:5]
+            top5 = sorted(data['by_base'].items(), key=by_count, reverse=True)[:5]
             crew_dist = ', '.join(f"{b}:{c}" for b, c in top5)
 
         legs_result.append({
@@ -1785,44 +2062,77 @@ def get_base_top20_legs(file_content, base, bid_year=2026):
     }
 
 
-def _draw_mpl_table(ax, col_labels, cell_data, hdr_color, fontsize=6.5):
-    """Draw a styled table filling the given axes."""
+def _draw_mpl_table(ax, col_labels, cell_data, hdr_color, fontsize=6.5,
+                    cell_colors=None, col_widths=None, left_cols=()):
+    """Draw a styled table filling the given axes.
+    
+    Cell backgrounds are one PatchCollection and the labels plain text, which
+    skips Axes.table's per-cell layout pass on every draw.
+    """
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Rectangle
+    
     n_rows = len(cell_data)
     n_cols = len(col_labels)
-    cell_colors = [
-        ['#eef2f8' if r % 2 == 0 else 'white'] * n_cols
-        for r in range(n_rows)
-    ]
-    tbl = ax.table(
-        cellText=cell_data,
-        colLabels=col_labels,
-        cellLoc='center',
-        loc='center',
-        bbox=[0, 0, 1, 1],
-        cellColours=cell_colors,
-    )
-    tbl.auto_set_font_size(False)
-    tbl.set_fontsize(fontsize)
-    for j in range(n_cols):
-        tbl[0, j].set_facecolor(hdr_color)
-        tbl[0, j].set_text_props(color='white', fontweight='bold')
-    for key, cell in tbl.get_celld().items():
-        cell.set_edgecolor('#cccccc')
-        cell.set_linewidth(0.3)
-    return tbl
+    if cell_colors is None:
+        cell_colors = [
+            ['#eef2f8' if r % 2 == 0 else 'white'] * n_cols
+            for r in range(n_rows)
+        ]
+    widths = col_widths or [1] * n_cols
+    total_w = sum(widths)
+    xs = [0.0]
+    for w in widths:
+        xs.append(xs[-1] + w / total_w)
+    row_h = 1.0 / (n_rows + 1)
+    
+    rects = []
+    facecolors = []
+    for r, (row, colors) in enumerate(zip([col_labels, *cell_data],
+                                          [[hdr_color] * n_cols, *cell_colors])):
+        y0 = 1.0 - (r + 1) * row_h
+        y = y0 + row_h / 2
+        hdr = r == 0
+        for j, (text, fc) in enumerate(zip(row, colors)):
+            x0, x1 = xs[j], xs[j + 1]
+            rects.append(Rectangle((x0, y0), x1 - x0, row_h))
+            facecolors.append(fc)
+            if j in left_cols and not hdr:
+                ax.text(x0 + (x1 - x0) * 0.1, y, text, ha='left', va='center',
+                        fontsize=fontsize, transform=ax.transAxes)
+            else:
+                ax.text((x0 + x1) / 2, y, text, ha='center', va='center',
+                        fontsize=fontsize, transform=ax.transAxes,
+                        color='white' if hdr else 'black',
+                        fontweight='bold' if hdr else 'normal')
+    ax.add_collection(PatchCollection(
+        rects, facecolors=facecolors, edgecolors='#cccccc', linewidths=0.3,
+        transform=ax.transAxes, clip_on=False, zorder=0,
+    ), autolim=False)
+
+
+def _draw_bars(ax, x, heights, width=0.8, **kwargs):
+    """Draw one bar series as a single PatchCollection instead of ax.bar."""
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Rectangle
+    
+    bars = PatchCollection(
+        [Rectangle((xi - width / 2, 0), width, h) for xi, h in zip(x, heights)],
+        edgecolor='none', **kwargs)
+    bars.sticky_edges.y.append(0)
+    ax.add_collection(bars)
+    return bars
 
 
 def _create_summary_fig(base, result, display_name, front_str, back_str):
     """Create landscape summary page figure for one base."""
-    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
     import matplotlib.gridspec as gridspec
-    import matplotlib
-    matplotlib.use('Agg')
 
     color = BASE_COLORS.get(base, '#444444')
     base_label = "All Bases" if base == "All Bases" else f"{base} Base"
 
-    fig = plt.figure(figsize=(11, 8.5))
+    fig = Figure(figsize=(11, 8.5))
     fig.patch.set_facecolor('white')
 
     # Standard print-safe margins: 0.5" on all sides
@@ -1876,56 +2186,48 @@ def _create_summary_fig(base, result, display_name, front_str, back_str):
     R_LEFT  = L_RIGHT + 0.06
     R_RIGHT = 1.0 - MARGIN_LR
 
-    # Table specs (title, height_fraction, headers, row_fn)
+    # Table specs (title, height_fraction, headers, rows)
     # Heights must sum to <= 1.0 accounting for gaps
     GAP     = 0.008          # gap between tables (figure fraction)
     T_LBL_H = 0.018          # height reserved for title label
 
+    # Per-length values are shared by the tables and the bar charts
+    def per_length(key):
+        return [result[key].get(i, 0) for i in range(1, 8)]
+
+    trip_counts   = per_length('trip_counts')
+    single_leg    = per_length('single_leg_pct')
+    front_commute = per_length('front_commute_pct')
+    back_commute  = per_length('back_commute_pct')
+    both_commute  = per_length('both_commute_pct')
+    redeye        = per_length('redeye_pct')
+    pct1 = "{:.1f}%".format
+    fmt2 = "{:.2f}".format
+    total_trips = max(result['total_trips'], 1)
+    single_leg_overall = (sum(n * p for n, p in zip(trip_counts, single_leg))
+                          / max(sum(trip_counts), 1))
+
+    hdr_total   = ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Total']
+    hdr_overall = ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall']
     table_specs = [
-        ('Trip Length Distribution',
-         0.170,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Total'],
-         lambda r: [[
-             'Count (%)',
-             *[f"{r['trip_counts'].get(i,0)}  ({r['trip_counts'].get(i,0)/max(r['total_trips'],1)*100:.0f}%)"
-               for i in range(1, 8)],
-             str(r['total_trips']),
-         ]]),
-        ('Single Leg on Last Day',
-         0.115,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall'],
-         lambda r: [['%',
-                     *[f"{r['single_leg_pct'].get(i,0):.1f}%" for i in range(1, 8)],
-                     f"{sum(r['trip_counts'].get(i,0)*r['single_leg_pct'].get(i,0) for i in range(1,8)) / max(sum(r['trip_counts'].get(i,0) for i in range(1,8)),1):.1f}%"]]),
-        ('Average Credit per Trip (hrs)',
-         0.115,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall'],
-         lambda r: [['Hrs',
-                     *[f"{r['avg_credit_by_length'].get(i,0):.2f}" for i in range(1, 8)],
-                     f"{r['avg_credit_per_trip']:.2f}"]]),
-        ('Average Credit per Day (hrs/day)',
-         0.115,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall'],
-         lambda r: [['Hrs/d',
-                     *[f"{r['avg_credit_per_day_by_length'].get(i,0):.2f}" for i in range(1, 8)],
-                     f"{r['avg_credit_per_day']:.2f}"]]),
-        ('Commutability',
-         0.220,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall'],
-         lambda r: [
-             ['Front', *[f"{r['front_commute_pct'].get(i,0):.1f}%" for i in range(1, 8)],
-              f"{r['front_commute_rate']:.1f}%"],
-             ['Back',  *[f"{r['back_commute_pct'].get(i,0):.1f}%"  for i in range(1, 8)],
-              f"{r['back_commute_rate']:.1f}%"],
-             ['Both',  *[f"{r['both_commute_pct'].get(i,0):.1f}%"  for i in range(1, 8)],
-              f"{r['both_commute_rate']:.1f}%"],
-         ]),
-        ('Red-Eye Trips',
-         0.115,
-         ['', '1-day', '2-day', '3-day', '4-day', '5-day', '6-day', '7-day', 'Overall'],
-         lambda r: [['%',
-                     *[f"{r['redeye_pct'].get(i,0):.1f}%" for i in range(1, 8)],
-                     f"{r['redeye_rate']:.1f}%"]]),
+        ('Trip Length Distribution', 0.170, hdr_total,
+         [['Count (%)',
+           *[f"{n}  ({n/total_trips*100:.0f}%)" for n in trip_counts],
+           str(result['total_trips'])]]),
+        ('Single Leg on Last Day', 0.115, hdr_overall,
+         [['%', *map(pct1, single_leg), pct1(single_leg_overall)]]),
+        ('Average Credit per Trip (hrs)', 0.115, hdr_overall,
+         [['Hrs', *map(fmt2, per_length('avg_credit_by_length')),
+           fmt2(result['avg_credit_per_trip'])]]),
+        ('Average Credit per Day (hrs/day)', 0.115, hdr_overall,
+         [['Hrs/d', *map(fmt2, per_length('avg_credit_per_day_by_length')),
+           fmt2(result['avg_credit_per_day'])]]),
+        ('Commutability', 0.220, hdr_overall,
+         [['Front', *map(pct1, front_commute), pct1(result['front_commute_rate'])],
+          ['Back',  *map(pct1, back_commute),  pct1(result['back_commute_rate'])],
+          ['Both',  *map(pct1, both_commute),  pct1(result['both_commute_rate'])]]),
+        ('Red-Eye Trips', 0.115, hdr_overall,
+         [['%', *map(pct1, redeye), pct1(result['redeye_rate'])]]),
     ]
 
     # Calculate heights in figure coordinates, top-to-bottom
@@ -1937,7 +2239,7 @@ def _create_summary_fig(base, result, display_name, front_str, back_str):
     frac_sum  = sum(s[1] for s in table_specs)
 
     cur_top = AREA_TOP   # start from top, walk downward
-    for title, frac, headers, rows_fn in table_specs:
+    for title, frac, headers, rows in table_specs:
         tbl_h  = avail_h * (frac / frac_sum)
         # Title label
         fig.text(L_LEFT, cur_top - T_LBL_H * 0.3, title,
@@ -1946,7 +2248,7 @@ def _create_summary_fig(base, result, display_name, front_str, back_str):
         ax_bot = cur_top - T_LBL_H - tbl_h
         ax = fig.add_axes([L_LEFT, ax_bot, L_W, tbl_h])
         ax.axis('off')
-        _draw_mpl_table(ax, headers, rows_fn(result), color, fontsize=7.0)
+        _draw_mpl_table(ax, headers, rows, color, fontsize=7.0)
         cur_top = ax_bot - GAP
 
     # ── Right side: 2x2 charts ────────────────────────────────────────────────
@@ -1959,37 +2261,36 @@ def _create_summary_fig(base, result, display_name, front_str, back_str):
                             wspace=0.40, hspace=0.60)
 
     lbl7 = ['1d', '2d', '3d', '4d', '5d', '6d', '7d']
+    x = range(7)
 
     ax1 = fig.add_subplot(gs[0, 0])
-    ax1.bar(lbl7, [result['trip_counts'].get(i, 0) for i in range(1, 8)], color=color, alpha=0.85)
+    _draw_bars(ax1, x, trip_counts, facecolor=color, alpha=0.85)
     ax1.set_title('Trip Length Distribution', fontsize=7, fontweight='bold', pad=2)
     ax1.set_ylabel('Count', fontsize=6)
 
     ax2 = fig.add_subplot(gs[0, 1])
-    ax2.bar(lbl7, [result['single_leg_pct'].get(i, 0) for i in range(1, 8)], color=color, alpha=0.85)
+    _draw_bars(ax2, x, single_leg, facecolor=color, alpha=0.85)
     ax2.set_title('Single Leg Last Day (%)', fontsize=7, fontweight='bold', pad=2)
     ax2.set_ylabel('%', fontsize=6)
 
     ax3 = fig.add_subplot(gs[1, 0])
-    x = range(7)
     w = 0.25
-    ax3.bar([xi - w for xi in x], [result['front_commute_pct'].get(i, 0) for i in range(1, 8)],
-            w, label='Front', color=color, alpha=0.9)
-    ax3.bar(list(x), [result['back_commute_pct'].get(i, 0) for i in range(1, 8)],
-            w, label='Back', color=color, alpha=0.6)
-    ax3.bar([xi + w for xi in x], [result['both_commute_pct'].get(i, 0) for i in range(1, 8)],
-            w, label='Both', color=color, alpha=0.3)
+    _draw_bars(ax3, [xi - w for xi in x], front_commute,
+               w, label='Front', facecolor=color, alpha=0.9)
+    _draw_bars(ax3, x, back_commute,
+               w, label='Back', facecolor=color, alpha=0.6)
+    _draw_bars(ax3, [xi + w for xi in x], both_commute,
+               w, label='Both', facecolor=color, alpha=0.3)
     ax3.set_title('Commutability (%)', fontsize=7, fontweight='bold', pad=2)
-    ax3.set_xticks(list(x))
-    ax3.set_xticklabels(lbl7, fontsize=6)
     ax3.legend(fontsize=5, loc='upper right')
 
     ax4 = fig.add_subplot(gs[1, 1])
-    ax4.bar(lbl7, [result['redeye_pct'].get(i, 0) for i in range(1, 8)], color='#e74c3c', alpha=0.85)
+    _draw_bars(ax4, x, redeye, facecolor='#e74c3c', alpha=0.85)
     ax4.set_title('Red-Eye Trips (%)', fontsize=7, fontweight='bold', pad=2)
     ax4.set_ylabel('%', fontsize=6)
 
     for ax in [ax1, ax2, ax3, ax4]:
+        ax.set_xticks(x, labels=lbl7)
         ax.tick_params(labelsize=6)
         ax.spines['top'].set_visible(False)
         ax.spines['right'].set_visible(False)
@@ -2000,10 +2301,8 @@ def _create_summary_fig(base, result, display_name, front_str, back_str):
 
 def _create_top20_fig(base, legs_data, display_name):
     """Create landscape Top-25 page figure."""
-    import matplotlib.pyplot as plt
-    import matplotlib
+    from matplotlib.figure import Figure
     import numpy as np
-    matplotlib.use('Agg')
 
     color = BASE_COLORS.get(base, '#444444')
     base_label = "All Bases" if base == "All Bases" else f"{base} BASE"
@@ -2011,7 +2310,7 @@ def _create_top20_fig(base, legs_data, display_name):
 
     # Use tight margins for print (0.5" = safe for all printers)
     # 0.5/11 = 0.0455 LR,  0.5/8.5 = 0.0588 TB
-    fig = plt.figure(figsize=(11, 8.5))
+    fig = Figure(figsize=(11, 8.5))
     fig.patch.set_facecolor('white')
     MARGIN_LR = 0.046
     MARGIN_TB = 0.060
@@ -2084,33 +2383,15 @@ def _create_top20_fig(base, legs_data, display_name):
     # Font size: smaller to fit 25 rows
     font_sz = 6.8 if n_rows <= 20 else 6.2
 
-    tbl = ax.table(
-        cellText=rows,
-        colLabels=headers,
-        cellLoc='center',
-        loc='upper center',
-        bbox=[0, 0, 1, 1],
-        cellColours=cell_colors,
-    )
-    tbl.auto_set_font_size(False)
-    tbl.set_fontsize(font_sz)
-
-    for j in range(n_cols):
-        tbl[0, j].set_facecolor(color)
-        tbl[0, j].set_text_props(color='white', fontweight='bold')
-    for key, cell in tbl.get_celld().items():
-        cell.set_edgecolor('#cccccc')
-        cell.set_linewidth(0.3)
-
     # Proportional column widths (base-specific)
-    if not is_all:
-        col_widths = [0.05, 0.09, 0.07, 0.07, 0.07, 0.65]
-        tw = sum(col_widths)
-        for j, cw in enumerate(col_widths):
-            for r in range(0, n_rows + 1):
-                tbl[r, j].set_width(cw / tw)
-        for r in range(1, n_rows + 1):
-            tbl[r, 5]._text.set_ha('left')
+    if is_all:
+        _draw_mpl_table(ax, headers, rows, color, fontsize=font_sz,
+                        cell_colors=cell_colors)
+    else:
+        _draw_mpl_table(ax, headers, rows, color, fontsize=font_sz,
+                        cell_colors=cell_colors,
+                        col_widths=[0.05, 0.09, 0.07, 0.07, 0.07, 0.65],
+                        left_cols=(5,))
 
     # Pie chart (base-specific only)
     if not is_all and total > 0:
@@ -2142,53 +2423,107 @@ def _create_top20_fig(base, legs_data, display_name):
     return fig
 
 
+def _write_base_pages(pdf, file_content, base, bid_year, display_name,
+                      front_time_str, back_time_str):
+    """
+    Add the summary and top-20 pages for one base to an open PdfPages.
+    Returns False, adding nothing, for a base with no trips (except All Bases).
+    """
+    def _t2m(s):
+        h, m = map(int, s.split(':'))
+        return h * 60 + m
+
+    result = analyze_file(
+        file_content, base, _t2m(front_time_str), _t2m(back_time_str), False, bid_year
+    )
+    if result['total_trips'] == 0 and base != "All Bases":
+        return False
+
+    # Pages are bare Figures (not pyplot-managed), so each one is
+    # freed as soon as it is written. They are all vector, so dpi only
+    # sets the (unused) raster resolution
+    pdf.savefig(_create_summary_fig(
+        base, result, display_name, front_time_str, back_time_str
+    ), dpi=72)
+
+    legs_data = get_base_top20_legs(file_content, base, bid_year)
+    pdf.savefig(_create_top20_fig(base, legs_data, display_name), dpi=72)
+    return True
+
+
+def _bases_with_trips(file_content, bid_year):
+    """Names of the bases (BASE_IDS, incl. UNKNOWN) with at least one trip occurrence"""
+    import numpy as np
+    
+    prep = _prepare_trips(file_content, bid_year)
+    occurrences = np.bincount(prep['base'], weights=prep['occurrences'], minlength=len(BASE_IDS))
+    return {base for base, base_id in BASE_IDS.items() if occurrences[base_id] > 0}
+
+
+def _apply_base_report_rc():
+    """
+    Set BASE_REPORT_RC in matplotlib's rcParams
+    Unlike rc_context, a concurrent report can't restore the old values mid-write
+    """
+    import matplotlib
+    
+    matplotlib.rcParams.update(BASE_REPORT_RC)
+
+
+@lru_cache(maxsize=1)
+def _no_trips_report():
+    """Single-page base report PDF for a selection with no trips"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(11, 8.5))
+    fig.patch.set_facecolor('white')
+    fig.text(0.5, 0.5, 'No trip data available', ha='center', va='center', fontsize=12)
+    buf = BytesIO()
+    _apply_base_report_rc()
+    with PdfPages(buf) as pdf:
+        pdf.savefig(fig, dpi=72)
+    return buf.getvalue()
+
+
 def generate_comprehensive_base_report(file_content, fdata, selected_base,
                                         front_time_str, back_time_str):
     """
     Generate comprehensive base report PDF bytes (single file only).
     If 'All Bases': AllBases Summary + Top20, then each base with trips.
     If specific base: Base Summary + Base Top20.
+    A selection with no trips gives a single "no data" page.
+    Every base renders in-process off the one cached parse of the file.
     """
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
     from matplotlib.backends.backend_pdf import PdfPages
 
     bid_year = fdata['year']
     display_name = fdata['display_name']
 
-    def _t2m(s):
-        h, m = map(int, s.split(':'))
-        return h * 60 + m
-
-    front_min = _t2m(front_time_str)
-    back_min = _t2m(back_time_str)
-
     known_bases = ['ATL', 'BOS', 'DTW', 'LAX', 'MSP', 'NYC', 'SEA', 'SLC']
 
-    if selected_base == "All Bases":
-        bases = ["All Bases"] + known_bases
+    # Bases without trips add no pages, so they never reach a renderer
+    with_trips = _bases_with_trips(file_content, bid_year)
+    if not with_trips:
+        bases = []
+    elif selected_base == "All Bases":
+        bases = ["All Bases"] + [base for base in known_bases if base in with_trips]
     else:
-        bases = [selected_base]
+        bases = [selected_base] if selected_base in with_trips else []
+    if not bases:
+        return _no_trips_report()
 
-    buf = BytesIO()
+    page_args = (bid_year, display_name, front_time_str, back_time_str)
+
+    # 18 full-page figures add up, so the PDF spills to disk past the spool size
+    buf = SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    # Fonts are embedded when PdfPages closes, so the rc must hold for its whole life
+    _apply_base_report_rc()
     with PdfPages(buf) as pdf:
         for base in bases:
-            result = analyze_file(
-                file_content, base, front_min, back_min, False, bid_year
-            )
-            if result['total_trips'] == 0 and base != "All Bases":
-                continue
-
-            fig = _create_summary_fig(
-                base, result, display_name, front_time_str, back_time_str
-            )
-            pdf.savefig(fig, dpi=150)
-            plt.close(fig)
+            _write_base_pages(pdf, file_content, base, *page_args)
 
-            legs_data = get_base_top20_legs(file_content, base, bid_year)
-            fig = _create_top20_fig(base, legs_data, display_name)
-            pdf.savefig(fig, dpi=150)
-            plt.close(fig)
-
-    return buf.getvalue()
+    buf.seek(0)
+    pdf_bytes = buf.read()
+    buf.close()
+    return pdf_bytes
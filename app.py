@@ -6,6 +6,7 @@ Analyzes trip scheduling data for airline pilot bids
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from collections import defaultdict
 from datetime import datetime
 import analysis_engine
 import hashlib
@@ -227,6 +228,11 @@ if 'file_counter' not in st.session_state:
 def get_file_hash(content):
     return hashlib.md5(content.encode()).hexdigest()[:8]
 
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_staffing_heatmap(content, bid_month, bid_year, base_filter):
+    # Every widget click reruns the script; the heat map only changes with the file or base
+    return analysis_engine.generate_staffing_heatmap(content, bid_month, bid_year, base_filter)
+
 # Sidebar
 st.sidebar.title("✈️ Trip Analysis Settings")
 
@@ -274,12 +280,10 @@ if st.session_state.uploaded_files and st.sidebar.button("🔄 Update Analysis",
         front_minutes = time_to_minutes[front_end_time]
         back_minutes = time_to_minutes[back_end_time]
         
-        for fname, fdata in st.session_state.uploaded_files.items():
-            result = analysis_engine.analyze_file(
-                fdata['content'], selected_base, front_minutes, back_minutes,
-                include_short_commute, fdata['year']
-            )
-            st.session_state.analysis_results[fname] = result
+        st.session_state.analysis_results = analysis_engine.analyze_files(
+            st.session_state.uploaded_files, selected_base, front_minutes, back_minutes,
+            include_short_commute
+        )
         
         st.success("✅ Analysis updated!")
         st.rerun()
@@ -404,12 +408,10 @@ if st.session_state.uploaded_files:
             front_minutes = time_to_minutes[front_end_time]
             back_minutes = time_to_minutes[back_end_time]
             
-            for fname, fdata in st.session_state.uploaded_files.items():
-                result = analysis_engine.analyze_file(
-                    fdata['content'], selected_base, front_minutes, back_minutes,
-                    include_short_commute, fdata['year']
-                )
-                st.session_state.analysis_results[fname] = result
+            st.session_state.analysis_results = analysis_engine.analyze_files(
+                st.session_state.uploaded_files, selected_base, front_minutes, back_minutes,
+                include_short_commute
+            )
             
             st.success("✅ Analysis complete!")
             st.rerun()
@@ -595,7 +597,7 @@ if st.session_state.analysis_results:
                 st.caption("Shows the number of pilots working each day of the month based on trip operations")
                 
                 with st.spinner("Generating staffing heat map..."):
-                    heatmap_data = analysis_engine.generate_staffing_heatmap(
+                    heatmap_data = get_staffing_heatmap(
                         fdata['content'], fdata['month'], fdata['year'], selected_base
                     )
                 
@@ -662,16 +664,8 @@ if st.session_state.analysis_results:
                         if bulk_input.strip():
                             try:
                                 reserve_data = {}
-                                month_abbr_map = {
-                                    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
-                                    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
-                                }
-                                month_map = {
-                                    'January': 1, 'February': 2, 'March': 3, 'April': 4,
-                                    'May': 5, 'June': 6, 'July': 7, 'August': 8,
-                                    'September': 9, 'October': 10, 'November': 11, 'December': 12
-                                }
                                 import re
+                                date_re = re.compile(r'(\d{1,2})([A-Z]{3})')
                                 for line in bulk_input.strip().split('\n'):
                                     line = line.strip()
                                     if not line or ',' not in line:
@@ -680,21 +674,21 @@ if st.session_state.analysis_results:
                                     if len(parts) >= 2:
                                         date_str = parts[0].strip().upper()
                                         required = int(parts[1].strip())
-                                        match = re.match(r'(\d{1,2})([A-Z]{3})', date_str)
+                                        match = date_re.match(date_str)
                                         if match:
                                             day = int(match.group(1))
                                             month_abbr = match.group(2)
-                                            month_num = month_abbr_map.get(month_abbr)
-                                            if month_num == month_map.get(fdata['month']):
+                                            month_num = analysis_engine.MONTH_ABBR_NUM.get(month_abbr)
+                                            if month_num == analysis_engine.MONTH_NAME_NUM.get(fdata['month']):
                                                 reserve_data[datetime(fdata['year'], month_num, day)] = required
                                 
                                 if reserve_data:
                                     matched_dates, reserve_required, pilots_on_duty = [], [], []
-                                    for date in dates:
+                                    for date, pilot_count in zip(dates, pilot_counts):
                                         if date in reserve_data:
                                             matched_dates.append(date)
                                             reserve_required.append(reserve_data[date])
-                                            pilots_on_duty.append(pilot_counts[dates.index(date)])
+                                            pilots_on_duty.append(pilot_count)
                                     
                                     if len(matched_dates) >= 3:
                                         correlation = np.corrcoef(reserve_required, pilots_on_duty)[0, 1]
@@ -946,10 +940,9 @@ if st.session_state.analysis_results:
                                     matching.append(trip)
                             
                             total_occ = sum(t.get('occurrences', 1) for t in matching)
-                            by_length = {}
+                            by_length = defaultdict(int)
                             for trip in matching:
-                                l = trip['length']
-                                by_length[l] = by_length.get(l, 0) + trip.get('occurrences', 1)
+                                by_length[trip['length']] += trip.get('occurrences', 1)
                             
                             st.success("✨ Quick Answer:")
                             st.markdown(f"**Found {len(matching)} unique patterns ({total_occ} total occurrences)** — both-ends commutable, Monday-Friday only")
@@ -1134,14 +1127,9 @@ if st.session_state.analysis_results:
         st.subheader("📈 Detailed Comparison Analysis")
         
         # ── Key metrics comparison row ────────────────────────────────────────
-        month_order_sort = {
-            'January': 1, 'February': 2, 'March': 3, 'April': 4,
-            'May': 5, 'June': 6, 'July': 7, 'August': 8,
-            'September': 9, 'October': 10, 'November': 11, 'December': 12
-        }
         sorted_files_metrics = sorted(
             st.session_state.analysis_results.keys(),
-            key=lambda f: (st.session_state.uploaded_files[f]['year'], month_order_sort[st.session_state.uploaded_files[f]['month']])
+            key=lambda f: (st.session_state.uploaded_files[f]['year'], analysis_engine.MONTH_NAME_NUM[st.session_state.uploaded_files[f]['month']])
         )
         metric_cols = st.columns(len(sorted_files_metrics))
         for i, fn in enumerate(sorted_files_metrics):
@@ -1207,14 +1195,9 @@ if st.session_state.analysis_results:
                         except Exception as e:
                             st.error(f"❌ Error: {str(e)}")
         
-        month_order = {
-            'January': 1, 'February': 2, 'March': 3, 'April': 4,
-            'May': 5, 'June': 6, 'July': 7, 'August': 8,
-            'September': 9, 'October': 10, 'November': 11, 'December': 12
-        }
         sorted_files = sorted(
             st.session_state.analysis_results.keys(),
-            key=lambda f: (st.session_state.uploaded_files[f]['year'], month_order[st.session_state.uploaded_files[f]['month']])
+            key=lambda f: (st.session_state.uploaded_files[f]['year'], analysis_engine.MONTH_NAME_NUM[st.session_state.uploaded_files[f]['month']])
         )
         num_files = len(sorted_files)
         show_differences = (num_files == 2)